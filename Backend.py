@@ -1,48 +1,192 @@
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify, send_file
 from flask_cors import CORS
-import mysql.connector
-from mysql.connector import Error, pooling
 from datetime import date
-from werkzeug.security import generate_password_hash, check_password_hash
+from decimal import Decimal
+from auth_tokens import can_act_for, issue_token, require_auth
+from catalog_cache import catalog_cache
+from contact_queue import ContactQueue, QueueFull
+from db_pool import PoolTimeout
+from image_pipeline import IMAGE_CACHE_DIR, add_srcset, submit as submit_image
+from inventory import INVENTORY_SHARDS, Inventory
+from json_provider import FastJSONProvider
+from metrics import registry as metrics
+from password_hashing import HashingUnavailable, hash_executor, hash_password, verify_password
+from product_ingest import ingest_products, iter_jsonl
+from slow_query_log import current_route
+from static_assets import IMMUTABLE, StaticAssets
+from storage import ER_DUP_ENTRY, Error, IntegrityError, create_backend
+from werkzeug.security import safe_join
+import base64
+import hashlib
+import json
 import os
+import re
+import threading
+import time
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# orjson-backed, Decimal as numbers and ISO dates (see json_provider.py)
+app.json = FastJSONProvider(app)
+CORS(app, expose_headers=["ETag", "X-Next-Cursor"])  # Enable CORS for all routes
 
 # ---------- DATABASE CONNECTION ----------
-# Create a connection pool
-db_config = {
-    "host": "localhost",
-    "user": "root",
-    "password": os.getenv('DB_PASSWORD', 'A@ihb064'),
-    "database": "mobile_shop",
-    "pool_name": "mypool",
-    "pool_size": 5
-}
+# MySQL by default; DB_BACKEND=sqlite (SQLITE_PATH, default in-memory) runs
+# the app without a database server
+database = create_backend()
+
+# Contact-form messages are written in batches (see contact_queue.py)
+contact_queue = ContactQueue(database)
+
+# Stock of flash-sale products is sharded and reserved at add-to-cart (see inventory.py)
+inventory = Inventory(database, on_change=catalog_cache.stock_changed)
+
+# Product edits mark this key, so reads that refill the catalog cache stay
+# on the primary for DB_STICKY_SECONDS instead of caching a lagging replica.
+# Orders only change stock; reads right after one stay on the replicas but
+# aren't cached for CATALOG_REPLICA_LAG seconds (see catalog_cache.py).
+CATALOG_KEY = "catalog"
+catalog_cache.on_change = lambda: database.mark_write(CATALOG_KEY)
+if os.getenv("DB_REPLICA_HOSTS", "").strip():
+    catalog_cache.replica_lag = float(os.getenv("CATALOG_REPLICA_LAG", "1"))
+
+# ---------- METRICS ----------
+# Request timings here; query and pool timings are recorded in storage.py /
+# db_pool.py (slow statements also go to slow_query_log.py), hashing
+# times in password_hashing.py
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # lets the slow-query log name the route that ran a statement
+    current_route.set(f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}")
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = (("method", request.method), ("route", route))
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - g.request_started, labels)
+    metrics.inc("http_requests_total", labels + (("status", str(response.status_code)),))
+    return response
+
+def _pool_stat(field):
+    return lambda: [({"pool": name}, pool.stats()[field]) for name, pool in database.pools().items()]
 
-try:
-    connection_pool = pooling.MySQLConnectionPool(**db_config)
-except Error as e:
-    print(f"Error creating connection pool: {e}")
-    connection_pool = None
+metrics.callback("db_pool_size", "gauge", "Maximum connections per pool", _pool_stat("size"))
+metrics.callback("db_pool_open_connections", "gauge", "Connections currently open", _pool_stat("open"))
+metrics.callback("db_pool_in_use_connections", "gauge", "Connections currently checked out", _pool_stat("in_use"))
+metrics.callback("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting", _pool_stat("timeouts"))
+metrics.callback("password_hash_pending", "gauge", "Hash jobs queued or running",
+                 lambda: [({}, hash_executor.pending)])
+metrics.callback("password_hash_capacity", "gauge", "Hash jobs allowed in flight",
+                 lambda: [({}, hash_executor.capacity)])
+metrics.callback("contact_queue_pending", "gauge", "Contact messages waiting to be written",
+                 lambda: [({}, contact_queue.stats()["pending"])])
 
-def get_connection():
+EMAIL_PATTERN = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+
+def get_connection(read_only=False, key=None):
+    """Check out a pooled connection.
+
+    Pass read_only=True for routes that never write so they can be served
+    by a replica; ``key`` (usually the user id) keeps reads on the primary
+    right after that user's own writes (see mark_write in db_router.py).
+    """
     try:
-        if connection_pool:
-            return connection_pool.get_connection()
+        return database.connect(read_only, key)
+    except PoolTimeout as e:
+        print(f"Error getting connection from pool: {e}")
         return None
     except Error as e:
-        print(f"Error getting connection from pool: {e}")
+        print(f"Error connecting to database: {e}")
         return None
 
-def get_cursor():
+def get_cursor(read_only=False, key=None):
     """Get a database cursor, creating connection if needed"""
-    db = get_connection()
+    db = get_connection(read_only, key)
     if db is None:
         return None, None
-    return db, db.cursor(dictionary=True)
+    return db, db.cursor()
+
+def conditional_json(payload, last_modified=None, etag=None):
+    """JSON response with a strong ETag (and Last-Modified when known).
+
+    Returns 304 with no body when the client's If-None-Match /
+    If-Modified-Since headers show it already has this representation.
+    ``payload`` may also be JSON that was already serialized (bytes), in
+    which case its precomputed ``etag`` can be passed to skip rehashing.
+    """
+    if isinstance(payload, bytes):
+        response = app.response_class(payload, mimetype=app.json.mimetype)
+    else:
+        response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    if last_modified:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
+
+def _row_modified(row):
+    return row.get("updated_at") or row.get("created_at")
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+def wants_stream():
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+def stream_json_rows(cursor, transform=None):
+    """Yield an executed cursor's result set as a JSON array, one fetchmany() batch at a time.
+
+    The cursor is unbuffered, so only STREAM_BATCH_SIZE rows are held in
+    memory.
+    """
+    try:
+        yield b"["
+        separator = b""
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            if transform:
+                rows = [transform(row) for row in rows]
+            yield separator + b",".join(app.json.dumps_bytes(row) for row in rows)
+            separator = b","
+        yield b"]"
+    except Error as e:
+        # Headers are already sent, so the truncated array is the error signal
+        print(f"Database error while streaming: {e}")
+
+def streamed_json(db, cursor, transform=None):
+    """Streaming response that takes ownership of ``db``/``cursor``.
+
+    They are released from the response's close hook, which the server
+    runs even when the body is never iterated (HEAD requests, clients
+    that disconnect before the first chunk).
+    """
+    def release():
+        try:
+            # A pooled connection can't be reused with unread rows pending
+            while cursor.fetchmany(STREAM_BATCH_SIZE):
+                pass
+        except Error:
+            pass
+        finally:
+            cursor.close()
+            db.close()
+
+    response = app.response_class(stream_json_rows(cursor, transform), mimetype=app.json.mimetype)
+    response.call_on_close(release)
+    return response
 
 # ---------- USER SIGNUP ----------
+DUPLICATE_KEY_PATTERN = re.compile(r"for key '(?:\w+\.)?(\w+)'")
+
+def duplicate_key_column(error):
+    """Name of the unique key a duplicate-entry (1062) error hit, e.g. 'email'"""
+    match = DUPLICATE_KEY_PATTERN.search(error.msg or "")
+    return match.group(1) if match else None
+
+
 @app.route("/signup", methods=["POST"])
 def signup():
     db = None
@@ -56,38 +200,48 @@ def signup():
         if not all(field in data for field in required_fields):
             return jsonify({"success": False, "message": "Username, email, and password are required"}), 400
         
-        db, cursor = get_cursor()
-        if db is None or cursor is None:
-            return jsonify({"success": False, "message": "Database connection failed"}), 500
-        
         username = data["username"].strip()
         email = data["email"].strip()
-        password = data["password"]
-        
-        # Check if username already exists
-        cursor.execute("SELECT user_id FROM users WHERE username=%s", (username,))
-        if cursor.fetchone():
-            return jsonify({"success": False, "message": "Username already exists"}), 400
+        # login() tells emails from usernames by the '@'
+        if "@" in username:
+            return jsonify({"success": False, "message": "Username cannot contain '@'"}), 400
         
-        # Check if email already exists
-        cursor.execute("SELECT user_id FROM users WHERE email=%s", (email,))
-        if cursor.fetchone():
-            return jsonify({"success": False, "message": "Email already exists"}), 400
+        # Hash before checking out a connection so the pool isn't held during hashing
+        hashed_password = hash_password(data["password"])
+
+        db, cursor = get_cursor()
+        if db is None or cursor is None:
+            return jsonify({"success": False, "message": "Database connection failed"}), 500
         
-        # Hash password and insert new user
-        hashed_password = generate_password_hash(password)
-        # Default role is customer
+        # The UNIQUE keys on username/email do the existence checks atomically
         query = "INSERT INTO users (username, email, password, role) VALUES (%s, %s, %s, 'customer')"
-        cursor.execute(query, (username, email, hashed_password))
-        db.commit()
+        try:
+            cursor.execute(query, (username, email, hashed_password))
+            db.commit()
+            # let an immediate login find the new account before replicas catch up
+            database.mark_write(f"login:{username}")
+            database.mark_write(f"login:{email}")
+        except IntegrityError as e:
+            db.rollback()
+            if e.errno != ER_DUP_ENTRY:
+                raise
+            field = duplicate_key_column(e)
+            if field == "email":
+                return jsonify({"success": False, "message": "Email already exists"}), 400
+            return jsonify({"success": False, "message": "Username already exists"}), 400
         
-        # Get the newly created user
-        user_id = cursor.lastrowid
-        cursor.execute("SELECT user_id, username, email, role FROM users WHERE user_id=%s", (user_id,))
-        user = cursor.fetchone()
+        user = {"user_id": cursor.lastrowid, "username": username, "email": email, "role": "customer"}
         
-        return jsonify({"success": True, "message": "Account created successfully", "user": user}), 201
+        return jsonify({
+            "success": True,
+            "message": "Account created successfully",
+            "user": user,
+            "token": issue_token(user["user_id"], user["role"])
+        }), 201
         
+    except HashingUnavailable as e:
+        print(f"Hashing error: {e}")
+        return jsonify({"success": False, "message": "Server busy, please try again"}), 503
     except Error as e:
         if db:
             db.rollback()
@@ -105,6 +259,22 @@ def signup():
             db.close()
 
 
+def store_rehashed_password(user_id, new_hash):
+    """Save an upgraded hash after login; failures only mean we retry next login"""
+    db, cursor = get_cursor()
+    if db is None or cursor is None:
+        return
+    try:
+        cursor.execute("UPDATE users SET password=%s WHERE user_id=%s", (new_hash, user_id))
+        db.commit()
+    except Error as e:
+        db.rollback()
+        print(f"Database error while rehashing password: {e}")
+    finally:
+        cursor.close()
+        db.close()
+
+
 # ---------- USER LOGIN ----------
 @app.route("/login", methods=["POST"])
 def login():
@@ -114,31 +284,39 @@ def login():
         if not request.json or "username" not in request.json or "password" not in request.json:
             return jsonify({"success": False, "message": "Username and password required"}), 400
         
-        db, cursor = get_cursor()
-        if db is None or cursor is None:
-            return jsonify({"success": False, "message": "Database connection failed"}), 500
-        
         data = request.json
         login_identifier = data["username"].strip()
         password = data["password"]
         
-        # Try login with username first, then with email
-        query = "SELECT * FROM users WHERE username=%s OR email=%s"
-        cursor.execute(query, (login_identifier, login_identifier))
+        db, cursor = get_cursor(read_only=True, key=f"login:{login_identifier}")
+        if db is None or cursor is None:
+            return jsonify({"success": False, "message": "Database connection failed"}), 500
+        
+        # One lookup on the matching unique index (usernames can't contain '@')
+        column = "email" if "@" in login_identifier else "username"
+        cursor.execute(f"SELECT * FROM users WHERE {column}=%s", (login_identifier,))
         user = cursor.fetchone()
 
-        if user and check_password_hash(user['password'], password):
+        # Give the connection back before the slow hash check
+        cursor.close()
+        db.close()
+        db = cursor = None
+
+        if not user:
+            return jsonify({"success": False, "message": "Invalid credentials"}), 401
+
+        matches, new_hash = verify_password(user['password'], password)
+        if matches:
+            if new_hash:
+                store_rehashed_password(user['user_id'], new_hash)
             # Don't return the password hash
             user.pop('password', None)
-            return jsonify({"success": True, "user": user})
-            
-        # Fallback for old plain text passwords (temporary, remove in production)
-        if user and user['password'] == password:
-             # Don't return the password
-            user.pop('password', None)
-            return jsonify({"success": True, "user": user})
+            return jsonify({"success": True, "user": user, "token": issue_token(user["user_id"], user["role"])})
 
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
+    except HashingUnavailable as e:
+        print(f"Hashing error: {e}")
+        return jsonify({"success": False, "message": "Server busy, please try again"}), 503
     except Error as e:
         print(f"Database error: {e}")
         return jsonify({"success": False, "message": "Database error"}), 500
@@ -182,9 +360,17 @@ def google_signin():
         user = cursor.fetchone()
         
         if not user:
-            # Create new user
+            # Release the connection while hashing, then take one back for the insert
+            cursor.close()
+            db.close()
+            db = cursor = None
+
             # Generate a random password for google users (they won't use it anyway)
-            random_password = generate_password_hash(os.urandom(16).hex())
+            random_password = hash_password(os.urandom(16).hex())
+
+            db, cursor = get_cursor()
+            if db is None:
+                return jsonify({"success": False, "message": "Database error"}), 500
             cursor.execute(
                 "INSERT INTO users (username, email, password, role) VALUES (%s, %s, %s, %s)",
                 (dummy_name, dummy_email, random_password, 'customer')
@@ -196,8 +382,11 @@ def google_signin():
         else:
             user.pop('password', None)
             
-        return jsonify({"success": True, "user": user})
+        return jsonify({"success": True, "user": user, "token": issue_token(user["user_id"], user["role"])})
         
+    except HashingUnavailable as e:
+        print(f"Hashing error: {e}")
+        return jsonify({"success": False, "message": "Server busy, please try again"}), 503
     except Exception as e:
         print(f"Google Signin Error: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
@@ -210,6 +399,7 @@ def google_signin():
 
 # ---------- ADD PRODUCT (ADMIN) ----------
 @app.route("/add-product", methods=["POST"])
+@require_auth(role="admin")
 def add_product():
     db = None
     cursor = None
@@ -227,10 +417,11 @@ def add_product():
             return jsonify({"message": "Missing required fields"}), 400
         
         query = """
-        INSERT INTO products (name, price, quantity, description, image)
-        VALUES (%s, %s, %s, %s, %s)
+        INSERT INTO products (sku, name, price, quantity, description, image)
+        VALUES (%s, %s, %s, %s, %s, %s)
         """
         cursor.execute(query, (
+            data.get("sku") or None,
             data["name"],
             data["price"],
             data["quantity"],
@@ -238,6 +429,9 @@ def add_product():
             data.get("image", "")
         ))
         db.commit()
+        catalog_cache.product_added()
+        # listings are rebuilt with image_srcset once the derivatives exist
+        submit_image(data.get("image"), catalog_cache.product_added)
         return jsonify({"message": "Product added"}), 201
     except Error as e:
         if db:
@@ -254,19 +448,323 @@ def add_product():
             db.close()
 
 
-# ---------- GET ALL PRODUCTS ----------
-@app.route("/products", methods=["GET"])
-def get_products():
+# ---------- BULK PRODUCT INGEST (ADMIN) ----------
+def collect_images(rows, images):
+    """Pass rows through, noting their image paths for the image pipeline"""
+    for row in rows:
+        if isinstance(row, dict) and row.get("image"):
+            images.add(row["image"])
+        yield row
+
+@app.route("/products/bulk", methods=["POST"])
+@require_auth(role="admin")
+def bulk_add_products():
+    """Upsert many products by sku from a JSON array or a JSON-lines body"""
+    db = None
+    try:
+        if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+            # read line by line so large feeds are never held in memory
+            rows = iter_jsonl(request.stream)
+        else:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                return jsonify({"message": "Expected a JSON array or JSON lines"}), 400
+
+        try:
+            chunk_size = max(1, int(request.args.get("chunk_size", 1000)))
+        except ValueError:
+            return jsonify({"message": "chunk_size must be an integer"}), 400
+
+        db = get_connection()
+        if db is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        
+        images = set()
+        report = ingest_products(db, collect_images(rows, images), chunk_size, inventory)
+        if report["accepted"]:
+            catalog_cache.clear()
+            for image in images:
+                submit_image(image, catalog_cache.product_added)
+        return jsonify({"message": "Bulk ingest complete", **report}), 200
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if db:
+            db.close()
+
+
+# ---------- HOT SKUS (ADMIN) ----------
+@app.route("/admin/hot-skus", methods=["GET"])
+@require_auth(role="admin")
+def list_hot_skus():
+    db, cursor = get_cursor()
+    if db is None or cursor is None:
+        return jsonify({"message": "Database connection failed"}), 500
+    try:
+        return jsonify(inventory.status(cursor)), 200
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    finally:
+        cursor.close()
+        db.close()
+
+
+@app.route("/admin/hot-skus", methods=["POST"])
+@require_auth(role="admin")
+def mark_hot_sku():
+    """Shard a product's stock for a flash sale: {"product_id": 1, "shards": 8}"""
     db = None
     cursor = None
     try:
+        data = request.get_json(silent=True) or {}
+        product_id = data.get("product_id")
+        shards = data.get("shards", INVENTORY_SHARDS)
+        if not isinstance(product_id, int) or not isinstance(shards, int):
+            return jsonify({"message": "Integer product_id and shards required"}), 400
+
         db, cursor = get_cursor()
         if db is None or cursor is None:
             return jsonify({"message": "Database connection failed"}), 500
-        
-        cursor.execute("SELECT * FROM products")
-        products = cursor.fetchall()
-        return jsonify(products), 200
+        try:
+            available = inventory.mark_hot(cursor, product_id, shards)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        if available is None:
+            db.rollback()
+            return jsonify({"message": "Product not found"}), 404
+        db.commit()
+        catalog_cache.invalidate_product(product_id)
+        return jsonify({"message": "Product marked hot", "product_id": product_id,
+                        "shards": shards, "available": available}), 200
+    except Error as e:
+        if db:
+            db.rollback()
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
+@app.route("/admin/hot-skus/<int:product_id>", methods=["DELETE"])
+@require_auth(role="admin")
+def unmark_hot_sku(product_id):
+    """Fold a hot product's shards and open reservations back into products.quantity"""
+    db = None
+    cursor = None
+    try:
+        db, cursor = get_cursor()
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        quantity = inventory.unmark_hot(cursor, product_id)
+        if quantity is None:
+            db.rollback()
+            return jsonify({"message": "Product is not hot"}), 404
+        db.commit()
+        catalog_cache.invalidate_product(product_id)
+        return jsonify({"message": "Product no longer hot", "product_id": product_id, "quantity": quantity}), 200
+    except Error as e:
+        if db:
+            db.rollback()
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
+# ---------- GET ALL PRODUCTS ----------
+PRODUCT_FIELDS = ("product_id", "sku", "name", "price", "quantity", "description", "image", "created_at", "updated_at")
+
+# sort name -> (column, direction); product_id breaks ties so the keyset is unique
+PRODUCT_SORTS = {
+    "id": ("product_id", "ASC"),
+    "price_asc": ("price", "ASC"),
+    "price_desc": ("price", "DESC"),
+    "newest": ("created_at", "DESC"),
+    "name": ("name", "ASC"),
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(sort_value, product_id):
+    raw = json.dumps([sort_value if isinstance(sort_value, int) else str(sort_value), product_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    sort_value, product_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return sort_value, int(product_id)
+
+def build_product_query(args, paginate=True):
+    """Translate /products query-string options into (sql, params, page).
+
+    Supported options: limit, cursor, min_price, max_price, in_stock,
+    sort (see PRODUCT_SORTS) and fields (comma separated column names).
+    With ``paginate=False`` (streamed exports) no LIMIT is applied.
+    Raises ValueError with a client-facing message for bad input.
+    """
+    sort = args.get("sort", "id")
+    if sort not in PRODUCT_SORTS:
+        raise ValueError(f"Invalid sort, expected one of: {', '.join(PRODUCT_SORTS)}")
+    sort_column, direction = PRODUCT_SORTS[sort]
+
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    if "fields" in args:
+        fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in PRODUCT_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"Invalid fields, expected any of: {', '.join(PRODUCT_FIELDS)}")
+    else:
+        fields = list(PRODUCT_FIELDS)
+    # the keyset columns are always read so the next cursor can be built
+    columns = list(dict.fromkeys(fields + ["product_id", sort_column]))
+
+    where = []
+    params = []
+    for arg, op in (("min_price", ">="), ("max_price", "<=")):
+        if arg in args:
+            try:
+                params.append(float(args[arg]))
+            except ValueError:
+                raise ValueError(f"{arg} must be a number")
+            where.append(f"price {op} %s")
+    if args.get("in_stock", "").lower() in ("1", "true", "yes"):
+        where.append("quantity > 0")
+
+    if args.get("cursor"):
+        try:
+            after_value, after_id = decode_cursor(args["cursor"])
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+        cmp = ">" if direction == "ASC" else "<"
+        if sort_column == "product_id":
+            where.append(f"product_id {cmp} %s")
+            params.append(after_id)
+        else:
+            where.append(f"({sort_column} {cmp} %s OR ({sort_column} = %s AND product_id {cmp} %s))")
+            params.extend([after_value, after_value, after_id])
+
+    sql = f"SELECT {', '.join(columns)} FROM products"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    order = f"{sort_column} {direction}"
+    if sort_column != "product_id":
+        order += f", product_id {direction}"
+    sql += f" ORDER BY {order}"
+    if paginate:
+        # one extra row tells us whether another page exists
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+
+    return sql, params, {"limit": limit, "fields": fields, "sort_column": sort_column}
+
+@app.route("/products", methods=["GET"])
+def get_products():
+    db = None
+    cursor = None
+    try:
+        stream = wants_stream()
+        try:
+            sql, params, page = build_product_query(request.args, paginate=not stream)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        if stream:
+            db, cursor = get_cursor(read_only=True, key=CATALOG_KEY)
+            if db is None or cursor is None:
+                return jsonify({"message": "Database connection failed"}), 500
+            cursor.execute(sql, params)
+            response = streamed_json(db, cursor, lambda p: add_srcset({f: p[f] for f in page["fields"]}))
+            db = cursor = None  # released when the response closes
+            return response
+
+        cache_key = tuple(sorted(request.args.items(multi=True)))
+        listing = catalog_cache.get_listing(cache_key)
+        if listing is None:
+            version = catalog_cache.version
+            db, cursor = get_cursor(read_only=True, key=CATALOG_KEY)
+            if db is None or cursor is None:
+                return jsonify({"message": "Database connection failed"}), 500
+            
+            cursor.execute(sql, params)
+            products = cursor.fetchall()
+
+            next_cursor = None
+            if len(products) > page["limit"]:
+                products = products[:page["limit"]]
+                last = products[-1]
+                next_cursor = encode_cursor(last[page["sort_column"]], last["product_id"])
+
+            modified = [_row_modified(p) for p in products if _row_modified(p)]
+            body = app.json.dumps_bytes([add_srcset({f: p[f] for f in page["fields"]}) for p in products])
+            listing = {
+                "body": body,
+                "etag": hashlib.sha1(body).hexdigest(),
+                "last_modified": max(modified) if modified else None,
+                "next_cursor": next_cursor,
+            }
+            catalog_cache.store_listing(cache_key, listing, version)
+
+        response = conditional_json(listing["body"], listing["last_modified"], etag=listing["etag"])
+        if listing["next_cursor"]:
+            response.headers["X-Next-Cursor"] = listing["next_cursor"]
+        return response
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
+# ---------- GET SINGLE PRODUCT ----------
+@app.route("/products/<int:product_id>", methods=["GET"])
+def get_product(product_id):
+    db = None
+    cursor = None
+    try:
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            version = catalog_cache.version
+            db, cursor = get_cursor(read_only=True, key=CATALOG_KEY)
+            if db is None or cursor is None:
+                return jsonify({"message": "Database connection failed"}), 500
+            
+            cursor.execute("SELECT * FROM products WHERE product_id=%s", (product_id,))
+            product = cursor.fetchone()
+            if not product:
+                return jsonify({"message": "Product not found"}), 404
+            catalog_cache.store_product(product, version)
+        return conditional_json(add_srcset(product), _row_modified(product))
     except Error as e:
         print(f"Database error: {e}")
         return jsonify({"message": "Database error"}), 500
@@ -281,7 +779,43 @@ def get_products():
 
 
 # ---------- ADD TO CART ----------
+def requested_user_id(data):
+    """The body's user_id, defaulting to the authenticated user"""
+    return data.get("user_id", g.user["user_id"])
+
+def forbidden():
+    return jsonify({"message": "Not allowed for this user"}), 403
+
+CART_UPSERT_ADD = " ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)"
+CART_UPSERT_SET = " ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)"
+
+def cached_products(cursor, product_ids):
+    """Product rows by id via the catalog cache, fetching all misses in one query"""
+    found = {}
+    missing = []
+    for product_id in product_ids:
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            missing.append(product_id)
+        else:
+            found[product_id] = product
+    if missing:
+        version = catalog_cache.version
+        id_list = ", ".join(["%s"] * len(missing))
+        cursor.execute(f"SELECT * FROM products WHERE product_id IN ({id_list})", missing)
+        for product in cursor.fetchall():
+            catalog_cache.store_product(product, version)
+            found[product["product_id"]] = product
+    return found
+
+def upsert_cart_lines(cursor, user_id, lines, on_duplicate):
+    """Write ``{product_id: quantity}`` cart lines in one multi-row statement"""
+    rows = ", ".join(["(%s, %s, %s)"] * len(lines))
+    params = [value for product_id, quantity in lines.items() for value in (user_id, product_id, quantity)]
+    cursor.execute(f"INSERT INTO cart (user_id, product_id, quantity) VALUES {rows}" + on_duplicate, params)
+
 @app.route("/cart/add", methods=["POST"])
+@require_auth()
 def add_to_cart():
     db = None
     cursor = None
@@ -289,33 +823,35 @@ def add_to_cart():
         if not request.json:
             return jsonify({"message": "Invalid request"}), 400
         
-        db, cursor = get_cursor()
-        if db is None or cursor is None:
-            return jsonify({"message": "Database connection failed"}), 500
-        
         data = request.json
-        required_fields = ["user_id", "product_id", "quantity"]
+        required_fields = ["product_id", "quantity"]
         if not all(field in data for field in required_fields):
             return jsonify({"message": "Missing required fields"}), 400
+        if type(data["product_id"]) is not int or type(data["quantity"]) is not int \
+                or data["quantity"] <= 0:
+            return jsonify({"message": "product_id must be an integer and quantity a positive integer"}), 400
+        user_id = requested_user_id(data)
+        if not can_act_for(user_id):
+            return forbidden()
         
-        # Check if product exists and has stock
-        cursor.execute("SELECT quantity FROM products WHERE product_id=%s", (data["product_id"],))
-        product = cursor.fetchone()
+        db, cursor = get_cursor()
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        
+        # Check if product exists and has stock (the order path re-checks authoritatively)
+        product = cached_products(cursor, [data["product_id"]]).get(data["product_id"])
         if not product:
             return jsonify({"message": "Product not found"}), 404
-        if product["quantity"] < data["quantity"]:
+        # hot SKUs take a reservation from their shards instead; None = not hot
+        reserved = inventory.reserve(cursor, user_id, data["product_id"], data["quantity"])
+        if reserved is False or (reserved is None and product["quantity"] < data["quantity"]):
+            db.rollback()
             return jsonify({"message": "Insufficient stock"}), 400
         
-        query = """
-        INSERT INTO cart (user_id, product_id, quantity)
-        VALUES (%s, %s, %s)
-        """
-        cursor.execute(query, (
-            data["user_id"],
-            data["product_id"],
-            data["quantity"]
-        ))
+        # Adding a product that is already in the cart merges into its line
+        upsert_cart_lines(cursor, user_id, {data["product_id"]: data["quantity"]}, CART_UPSERT_ADD)
         db.commit()
+        database.mark_write(user_id)
         return jsonify({"message": "Added to cart"}), 201
     except Error as e:
         if db:
@@ -332,23 +868,144 @@ def add_to_cart():
             db.close()
 
 
+# ---------- BATCH CART UPDATE ----------
+def _cart_lines(entries, field):
+    """Validate [{"product_id", "quantity"}, ...] into {product_id: quantity}"""
+    lines = {}
+    for entry in entries:
+        # type() rather than isinstance(), which would accept true/false
+        if not isinstance(entry, dict) or type(entry.get("product_id")) is not int \
+                or type(entry.get("quantity")) is not int or entry["quantity"] < 0:
+            raise ValueError(f"Each '{field}' entry needs an integer product_id and a non-negative quantity")
+        if field == "add":
+            lines[entry["product_id"]] = lines.get(entry["product_id"], 0) + entry["quantity"]
+        else:
+            lines[entry["product_id"]] = entry["quantity"]
+    return lines
+
+@app.route("/cart/batch", methods=["POST"])
+@require_auth()
+def batch_cart():
+    """Apply several cart changes in one transaction.
+
+    Body: {"user_id": 1,                                # optional, defaults to the caller
+           "add": [{"product_id": 1, "quantity": 2}],   # merged into existing lines
+           "set": [{"product_id": 2, "quantity": 1}],   # quantity 0 removes the line
+           "remove": [3, 4]}                            # product ids
+    """
+    db = None
+    cursor = None
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"message": "Invalid request"}), 400
+        user_id = requested_user_id(data)
+        if not can_act_for(user_id):
+            return forbidden()
+        
+        try:
+            add = _cart_lines(data.get("add", []), "add")
+            set_lines = _cart_lines(data.get("set", []), "set")
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        remove = set(data.get("remove", []))
+        if not all(type(product_id) is int for product_id in remove):
+            return jsonify({"message": "'remove' must be a list of product ids"}), 400
+        remove.update(product_id for product_id, quantity in set_lines.items() if quantity == 0)
+        set_lines = {pid: qty for pid, qty in set_lines.items() if qty > 0}
+        add = {pid: qty for pid, qty in add.items() if qty > 0}
+        if not (add or set_lines or remove):
+            return jsonify({"message": "No cart changes given"}), 400
+
+        db, cursor = get_cursor()
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        
+        requested = {**add, **set_lines}
+        products = cached_products(cursor, list(requested))
+        errors = []
+        for product_id, quantity in requested.items():
+            if product_id not in products:
+                errors.append({"product_id": product_id, "error": "Product not found"})
+            elif inventory.is_hot(product_id):
+                continue  # added units are reserved below, the rest checked at order time
+            elif products[product_id]["quantity"] < quantity:
+                errors.append({"product_id": product_id, "error": "Insufficient stock"})
+        if not errors:
+            for product_id, quantity in add.items():
+                if inventory.reserve(cursor, user_id, product_id, quantity) is False:
+                    errors.append({"product_id": product_id, "error": "Insufficient stock"})
+        if errors:
+            db.rollback()
+            return jsonify({"message": "Cart not updated", "errors": errors}), 400
+
+        # what is left of removed or re-set lines after this batch; any
+        # hot-SKU reservations beyond that are released below
+        remaining = {product_id: 0 for product_id in remove}
+        for product_id, quantity in add.items():
+            if product_id in remaining:
+                remaining[product_id] += quantity
+        remaining.update(set_lines)
+
+        removed = 0
+        if remove:
+            id_list = ", ".join(["%s"] * len(remove))
+            cursor.execute(f"DELETE FROM cart WHERE user_id=%s AND product_id IN ({id_list})",
+                           [user_id, *remove])
+            removed = cursor.rowcount
+        if add:
+            upsert_cart_lines(cursor, user_id, add, CART_UPSERT_ADD)
+        if set_lines:
+            upsert_cart_lines(cursor, user_id, set_lines, CART_UPSERT_SET)
+        inventory.release(cursor, user_id, remaining)
+        db.commit()
+        database.mark_write(user_id)
+        return jsonify({
+            "message": "Cart updated",
+            "added": len(add),
+            "updated": len(set_lines),
+            "removed": removed
+        }), 200
+    except Error as e:
+        if db:
+            db.rollback()
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
 # ---------- VIEW CART ----------
 @app.route("/cart/<int:user_id>", methods=["GET"])
+@require_auth()
 def view_cart(user_id):
     db = None
     cursor = None
     try:
-        db, cursor = get_cursor()
+        if not can_act_for(user_id):
+            return forbidden()
+
+        db, cursor = get_cursor(read_only=True, key=user_id)
         if db is None or cursor is None:
             return jsonify({"message": "Database connection failed"}), 500
         
         query = """
-        SELECT c.cart_id, p.name, p.price, c.quantity
+        SELECT c.cart_id, c.product_id, p.name, p.price, c.quantity
         FROM cart c
         JOIN products p ON c.product_id = p.product_id
         WHERE c.user_id=%s
         """
         cursor.execute(query, (user_id,))
+        if wants_stream():
+            response = streamed_json(db, cursor)
+            db = cursor = None  # released when the response closes
+            return response
         cart_items = cursor.fetchall()
         return jsonify(cart_items), 200
     except Error as e:
@@ -366,6 +1023,7 @@ def view_cart(user_id):
 
 # ---------- REMOVE FROM CART ----------
 @app.route("/cart/<int:cart_id>", methods=["DELETE"])
+@require_auth()
 def remove_from_cart(cart_id):
     db = None
     cursor = None
@@ -374,10 +1032,16 @@ def remove_from_cart(cart_id):
         if db is None or cursor is None:
             return jsonify({"message": "Database connection failed"}), 500
         
-        cursor.execute("DELETE FROM cart WHERE cart_id=%s", (cart_id,))
-        if cursor.rowcount == 0:
+        cursor.execute("SELECT user_id, product_id FROM cart WHERE cart_id=%s FOR UPDATE", (cart_id,))
+        line = cursor.fetchone()
+        if line is None or (g.user["role"] != "admin" and line["user_id"] != g.user["user_id"]):
+            db.rollback()
             return jsonify({"message": "Cart item not found"}), 404
+        cursor.execute("DELETE FROM cart WHERE cart_id=%s", (cart_id,))
+        # a hot SKU's reserved units go straight back to its shards
+        inventory.release(cursor, line["user_id"], {line["product_id"]: 0})
         db.commit()
+        database.mark_write(g.user["user_id"])
         return jsonify({"message": "Item removed from cart"}), 200
     except Error as e:
         if db:
@@ -395,78 +1059,210 @@ def remove_from_cart(cart_id):
 
 
 # ---------- PLACE ORDER ----------
+class OrderError(Exception):
+    """The cart can't be turned into an order; carries the failed cart lines"""
+
+    def __init__(self, message, failed_items=None):
+        super().__init__(message)
+        self.message = message
+        self.failed_items = failed_items or []
+
+    def response(self):
+        body = {"message": self.message}
+        if self.failed_items:
+            body["failed_items"] = self.failed_items
+        return jsonify(body), 400
+
+def create_order(cursor, user_id):
+    """Turn ``user_id``'s cart into an order inside the caller's transaction.
+
+    Uses a fixed number of statements however big the cart is, including
+    the order's row in order_summaries. The cart rows are locked first,
+    then the product rows in ascending product_id order, so concurrent
+    checkouts always lock in the same order and can't oversell or deadlock
+    each other. Hot SKUs (see inventory.py) are not locked; the buyer's
+    reservations are consumed instead. Raises OrderError (the caller rolls
+    back) listing every line that can't be fulfilled or whose quantity
+    isn't positive. Returns (order_id, total, {product_id: quantity})
+    where the quantities are those taken off products.quantity (hot SKUs'
+    rows are updated by the inventory reconciler).
+    """
+    cursor.execute("SELECT product_id, quantity FROM cart WHERE user_id=%s FOR UPDATE", (user_id,))
+    wanted = {}
+    invalid = []
+    for line in cursor.fetchall():
+        if line["quantity"] <= 0:
+            invalid.append({"product_id": line["product_id"], "requested": line["quantity"]})
+        wanted[line["product_id"]] = wanted.get(line["product_id"], 0) + line["quantity"]
+    if not wanted:
+        raise OrderError("Cart is empty")
+    if invalid:
+        # would add stock back and lower the order total
+        raise OrderError("Invalid cart quantity", sorted(invalid, key=lambda item: item["product_id"]))
+
+    product_ids = sorted(wanted)
+    hot = inventory.hot_skus_in(cursor, product_ids)
+    locked_ids = [pid for pid in product_ids if pid not in hot]
+    products = {}
+    if locked_ids:
+        cursor.execute(f"""
+            SELECT product_id, name, price, quantity
+            FROM products
+            WHERE product_id IN ({", ".join(["%s"] * len(locked_ids))})
+            ORDER BY product_id
+            FOR UPDATE
+        """, locked_ids)
+        products.update((p["product_id"], p) for p in cursor.fetchall())
+    if hot:
+        # name and price only; stock lives in inventory_shards
+        cursor.execute(f"""
+            SELECT product_id, name, price, quantity
+            FROM products
+            WHERE product_id IN ({", ".join(["%s"] * len(hot))})
+        """, sorted(hot))
+        products.update((p["product_id"], p) for p in cursor.fetchall())
+
+    failed = []
+    for product_id in locked_ids:
+        available = products[product_id]["quantity"] if product_id in products else 0
+        if available < wanted[product_id]:
+            failed.append({"product_id": product_id, "requested": wanted[product_id], "available": available})
+    if hot:
+        failed.extend(inventory.consume(cursor, user_id, {pid: wanted[pid] for pid in hot}, hot))
+    if failed:
+        raise OrderError("Insufficient stock", sorted(failed, key=lambda item: item["product_id"]))
+
+    total = sum(products[pid]["price"] * wanted[pid] for pid in product_ids)
+    cursor.execute("""
+        INSERT INTO orders (user_id, order_date, total_amount, status)
+        VALUES (%s, %s, %s, %s)
+    """, (user_id, date.today(), total, "Placed"))
+    order_id = cursor.lastrowid
+
+    item_rows = ", ".join(["(%s, %s, %s, %s)"] * len(product_ids))
+    item_params = []
+    for pid in product_ids:
+        item_params.extend([order_id, pid, wanted[pid], products[pid]["price"]])
+    cursor.execute(f"INSERT INTO order_items (order_id, product_id, quantity, price) VALUES {item_rows}", item_params)
+
+    # one set-based decrement; the rows are locked and checked above
+    if locked_ids:
+        cases = " ".join(["WHEN %s THEN %s"] * len(locked_ids))
+        case_params = [value for pid in locked_ids for value in (pid, wanted[pid])]
+        cursor.execute(f"""
+            UPDATE products
+            SET quantity = quantity - CASE product_id {cases} END
+            WHERE product_id IN ({", ".join(["%s"] * len(locked_ids))})
+        """, case_params + locked_ids)
+
+    cursor.execute("DELETE FROM cart WHERE user_id=%s", (user_id,))
+
+    items = [
+        {"product_id": pid, "name": products[pid]["name"], "quantity": wanted[pid], "price": float(products[pid]["price"])}
+        for pid in product_ids
+    ]
+    # copied from the orders row so both share created_at
+    cursor.execute("""
+        INSERT INTO order_summaries (order_id, user_id, created_at, order_date, status, total_amount, item_count, items)
+        SELECT order_id, user_id, created_at, order_date, status, total_amount, %s, %s
+        FROM orders WHERE order_id=%s
+    """, (sum(wanted.values()), json.dumps(items), order_id))
+    return order_id, total, {pid: wanted[pid] for pid in locked_ids}
+
+def record_payment(cursor, order_id, method, status="Success"):
+    """Insert a payment and mirror it onto the order's summary (caller commits)"""
+    today = date.today()
+    cursor.execute("""
+        INSERT INTO payments (order_id, payment_method, payment_status, payment_date)
+        VALUES (%s, %s, %s, %s)
+    """, (order_id, method, status, today))
+    cursor.execute("""
+        UPDATE order_summaries SET payment_status=%s, payment_method=%s, payment_date=%s
+        WHERE order_id=%s
+    """, (status, method, today, order_id))
+
 @app.route("/order", methods=["POST"])
+@require_auth()
 def place_order():
     db = None
     cursor = None
     try:
-        if not request.json or "user_id" not in request.json:
-            return jsonify({"message": "User ID required"}), 400
+        user_id = requested_user_id(request.get_json(silent=True) or {})
+        if not can_act_for(user_id):
+            return forbidden()
         
         db, cursor = get_cursor()
         if db is None or cursor is None:
             return jsonify({"message": "Database connection failed"}), 500
-        
-        data = request.json
-        user_id = data["user_id"]
-
-        # calculate total
-        cursor.execute("""
-            SELECT p.product_id, p.price, c.quantity, p.quantity as stock
-            FROM cart c
-            JOIN products p ON c.product_id = p.product_id
-            WHERE c.user_id=%s
-        """, (user_id,))
-        items = cursor.fetchall()
-
-        if not items or len(items) == 0:
-            return jsonify({"message": "Cart is empty"}), 400
-
-        # Check stock availability
-        for item in items:
-            if item["stock"] < item["quantity"]:
-                return jsonify({"message": f"Insufficient stock for product {item['product_id']}"}), 400
-
-        total = sum(item["price"] * item["quantity"] for item in items)
 
         # Perform transaction (mysql.connector uses autocommit=False by default)
         try:
-            # create order
-            cursor.execute("""
-                INSERT INTO orders (user_id, order_date, total_amount, status)
-                VALUES (%s, %s, %s, %s)
-            """, (user_id, date.today(), total, "Placed"))
-            order_id = cursor.lastrowid
-
-            # insert order items and reduce stock
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO order_items (order_id, product_id, quantity, price)
-                    VALUES (%s, %s, %s, %s)
-                """, (order_id, item["product_id"], item["quantity"], item["price"]))
-
-                # reduce stock
-                cursor.execute("""
-                    UPDATE products
-                    SET quantity = quantity - %s
-                    WHERE product_id = %s
-                """, (item["quantity"], item["product_id"]))
-
-            # clear cart
-            cursor.execute("DELETE FROM cart WHERE user_id=%s", (user_id,))
-            
-            # Commit transaction
+            order_id, total, quantities = create_order(cursor, user_id)
             db.commit()
-            return jsonify({"message": "Order placed", "order_id": order_id}), 201
-            
-        except Exception as e:
-            if db:
-                db.rollback()
-            raise e
+            database.mark_write(user_id)
+        except OrderError as e:
+            db.rollback()
+            return e.response()
+        except Exception:
+            db.rollback()
+            raise
+
+        catalog_cache.stock_changed({pid: -qty for pid, qty in quantities.items()})
+        return jsonify({"message": "Order placed", "order_id": order_id}), 201
             
     except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
         if db:
+            db.close()
+
+
+# ---------- CHECKOUT (ORDER + PAYMENT) ----------
+@app.route("/checkout", methods=["POST"])
+@require_auth()
+def checkout():
+    """Place the order and record its payment in one transaction on one connection"""
+    db = None
+    cursor = None
+    try:
+        if not request.json or "method" not in request.json:
+            return jsonify({"message": "Payment method required"}), 400
+        
+        data = request.json
+        user_id = requested_user_id(data)
+        if not can_act_for(user_id):
+            return forbidden()
+        
+        db, cursor = get_cursor()
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+
+        try:
+            order_id, total, quantities = create_order(cursor, user_id)
+            record_payment(cursor, order_id, data["method"])
+            db.commit()
+            database.mark_write(user_id)
+        except OrderError as e:
+            db.rollback()
+            return e.response()
+        except Exception:
             db.rollback()
+            raise
+
+        catalog_cache.stock_changed({pid: -qty for pid, qty in quantities.items()})
+        return jsonify({
+            "message": "Order placed and paid",
+            "order_id": order_id,
+            "total": total,
+            "payment_status": "Success"
+        }), 201
+    except Error as e:
         print(f"Database error: {e}")
         return jsonify({"message": "Database error"}), 500
     except Exception as e:
@@ -481,6 +1277,7 @@ def place_order():
 
 # ---------- PAYMENT ----------
 @app.route("/payment", methods=["POST"])
+@require_auth()
 def payment():
     db = None
     cursor = None
@@ -495,16 +1292,16 @@ def payment():
         data = request.json
         
         # Verify order exists
-        cursor.execute("SELECT order_id FROM orders WHERE order_id=%s", (data["order_id"],))
+        cursor.execute("SELECT order_id, user_id FROM orders WHERE order_id=%s", (data["order_id"],))
         order = cursor.fetchone()
         if not order:
             return jsonify({"message": "Order not found"}), 404
+        if not can_act_for(order["user_id"]):
+            return forbidden()
         
-        cursor.execute("""
-            INSERT INTO payments (order_id, payment_method, payment_status, payment_date)
-            VALUES (%s, %s, %s, %s)
-        """, (data["order_id"], data["method"], "Success", date.today()))
+        record_payment(cursor, data["order_id"], data["method"])
         db.commit()
+        database.mark_write(order["user_id"])
         return jsonify({"message": "Payment successful"}), 201
     except Error as e:
         if db:
@@ -521,11 +1318,109 @@ def payment():
             db.close()
 
 
+# ---------- ORDER HISTORY ----------
+# Served from order_summaries (one row per order, kept up to date by
+# create_order / record_payment), so no joins over orders, order_items and
+# payments are needed
+ORDER_SUMMARY_COLUMNS = ("order_id", "user_id", "created_at", "order_date", "status", "total_amount",
+                         "item_count", "payment_status", "payment_method", "payment_date")
+DEFAULT_ORDER_PAGE_SIZE = 20
+MAX_ORDER_PAGE_SIZE = 100
+
+@app.route("/orders/<int:user_id>", methods=["GET"])
+@require_auth()
+def list_orders(user_id):
+    """Newest orders first; pass the X-Next-Cursor header back as ?cursor= for the next page"""
+    db = None
+    cursor = None
+    try:
+        if not can_act_for(user_id):
+            return forbidden()
+        try:
+            limit = min(max(1, int(request.args.get("limit", DEFAULT_ORDER_PAGE_SIZE))), MAX_ORDER_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"message": "limit must be an integer"}), 400
+
+        # a single range scan of idx_order_summaries_user_created
+        sql = f"SELECT {', '.join(ORDER_SUMMARY_COLUMNS)} FROM order_summaries WHERE user_id=%s"
+        params = [user_id]
+        if request.args.get("cursor"):
+            try:
+                after_created, after_id = decode_cursor(request.args["cursor"])
+            except (ValueError, TypeError):
+                return jsonify({"message": "Invalid cursor"}), 400
+            sql += " AND (created_at < %s OR (created_at = %s AND order_id < %s))"
+            params.extend([after_created, after_created, after_id])
+        sql += " ORDER BY created_at DESC, order_id DESC LIMIT %s"
+        params.append(limit + 1)
+
+        db, cursor = get_cursor(read_only=True, key=user_id)
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        cursor.execute(sql, params)
+        orders = cursor.fetchall()
+
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1]["created_at"], orders[-1]["order_id"])
+        response = jsonify(orders)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
+@app.route("/order/<int:order_id>", methods=["GET"])
+@require_auth()
+def get_order(order_id):
+    db = None
+    cursor = None
+    try:
+        db, cursor = get_cursor(read_only=True, key=g.user["user_id"])
+        if db is None or cursor is None:
+            return jsonify({"message": "Database connection failed"}), 500
+        cursor.execute(f"SELECT {', '.join(ORDER_SUMMARY_COLUMNS)}, items FROM order_summaries WHERE order_id=%s",
+                       (order_id,))
+        order = cursor.fetchone()
+        if not order:
+            return jsonify({"message": "Order not found"}), 404
+        if not can_act_for(order["user_id"]):
+            return forbidden()
+        order["items"] = json.loads(order["items"], parse_float=Decimal)
+        return jsonify(order), 200
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"message": "Database error"}), 500
+    except Exception as e:
+        print(f"Server error: {e}")
+        return jsonify({"message": "Server error"}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+
 # ---------- CONTACT FORM ----------
 @app.route("/api/contact", methods=["POST"])
 def contact():
-    db = None
-    cursor = None
+    """Accept a contact-form message for the write-behind queue.
+
+    Answers 202 {"success": true, "message": ...}. The row is inserted
+    later by a batch, so there is no ``message_id`` in the response any
+    more (it used to be 201 with the new row's id).
+    """
     try:
         if not request.json:
             return jsonify({"success": False, "message": "Invalid request"}), 400
@@ -535,10 +1430,6 @@ def contact():
         if not all(field in data for field in required_fields):
             return jsonify({"success": False, "message": "All fields are required"}), 400
         
-        db, cursor = get_cursor()
-        if db is None or cursor is None:
-            return jsonify({"success": False, "message": "Database connection failed"}), 500
-        
         name = data["name"].strip()
         email = data["email"].strip()
         subject = data["subject"].strip()
@@ -546,64 +1437,129 @@ def contact():
         user_id = data.get("user_id")  # Optional: track logged-in users
         
         # Validate email format
-        import re
-        email_pattern = r'^[^\s@]+@[^\s@]+\.[^\s@]+$'
-        if not re.match(email_pattern, email):
+        if not EMAIL_PATTERN.match(email):
             return jsonify({"success": False, "message": "Invalid email format"}), 400
+        if len(name) > 100 or len(email) > 100 or len(subject) > 200:
+            return jsonify({"success": False, "message": "Name, email or subject is too long"}), 400
+        if user_id is not None and not isinstance(user_id, int):
+            return jsonify({"success": False, "message": "Invalid user_id"}), 400
         
-        # Create contact_messages table if it doesn't exist (matches database.sql schema)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS contact_messages (
-                message_id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT DEFAULT NULL,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) NOT NULL,
-                subject VARCHAR(200) NOT NULL,
-                message TEXT NOT NULL,
-                status ENUM('new', 'read', 'replied', 'archived') DEFAULT 'new',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL
-            )
-        """)
-        
-        # Insert contact message
-        query = """
-        INSERT INTO contact_messages (user_id, name, email, subject, message)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.execute(query, (user_id, name, email, subject, message))
-        db.commit()
-        
-        message_id = cursor.lastrowid
+        # Accepted once it is in the durable spool; the database write follows in a batch
+        contact_queue.submit(user_id, name, email, subject, message)
         
         return jsonify({
             "success": True, 
-            "message": "Your message has been sent successfully. We'll get back to you soon!",
-            "message_id": message_id
-        }), 201
+            "message": "Your message has been sent successfully. We'll get back to you soon!"
+        }), 202
         
-    except Error as e:
-        if db:
-            db.rollback()
-        print(f"Database error: {e}")
-        return jsonify({"success": False, "message": "Database error"}), 500
+    except QueueFull as e:
+        print(f"Contact queue error: {e}")
+        return jsonify({"success": False, "message": "Server busy, please try again"}), 503
     except Exception as e:
-        if db:
-            db.rollback()
         print(f"Server error: {e}")
         return jsonify({"success": False, "message": "Server error"}), 500
+
+
+@app.route("/pool/stats", methods=["GET"])
+def pool_stats():
+    return jsonify({**database.stats(), "contact_queue": contact_queue.stats()}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------- IMAGE DERIVATIVES ----------
+# Resized WebP/JPEG copies from image_pipeline.py; the directory name is a
+# hash of the source image, so a URL's content never changes
+@app.route("/media/<path:filename>", methods=["GET"])
+def media_files(filename):
+    path = safe_join(IMAGE_CACHE_DIR, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({"message": "Not found"}), 404
+    response = send_file(path, etag=True, conditional=True, max_age=None)
+    response.headers["Cache-Control"] = IMMUTABLE
+    return response
+
+
+# ---------- FRONT END ----------
+# Pages, script.js and src/ images; run build_assets.py for fingerprinted,
+# precompressed files (see static_assets.py)
+static_assets = StaticAssets()
+
+@app.route("/", methods=["GET"])
+@app.route("/<path:filename>", methods=["GET"])
+def static_files(filename="index.html"):
+    # API routes are matched first; this only sees paths no route claims
+    response = static_assets.response(filename, request)
+    if response is None:
+        return jsonify({"message": "Not found"}), 404
+    return response
+
+
+# ---------- HEALTH CHECKS ----------
+WARM_CONNECTIONS = int(os.getenv("WARM_CONNECTIONS", "2"))
+warmed_up = threading.Event()
+
+def warm_up():
+    """Open pooled connections, prime the catalog cache and start the
+    inventory reconciler and contact queue before taking traffic.
+
+    gunicorn.conf.py calls this in every worker after fork; /readyz
+    answers 503 until it has run.
+    """
+    try:
+        opened = database.warm_up(WARM_CONNECTIONS)
+        print(f"Warmup opened {opened} database connections")
+    except Error as e:
+        print(f"Warmup could not open database connections: {e}")
+    with app.test_client() as client:
+        client.get("/products")  # first listing page into the catalog cache
+    inventory.start()
+    try:
+        contact_queue.start()  # replays spools left by dead workers now, not on the next message
+    except OSError as e:
+        print(f"Warmup could not start the contact queue: {e}")
+    warmed_up.set()
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: warmed up and able to reach the database"""
+    if not warmed_up.is_set():
+        return jsonify({"status": "warming up"}), 503
+    db, cursor = get_cursor()
+    if db is None or cursor is None:
+        return jsonify({"status": "database unavailable"}), 503
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return jsonify({"status": "ready"}), 200
+    except Error as e:
+        print(f"Database error: {e}")
+        return jsonify({"status": "database unavailable"}), 503
     finally:
-        if cursor:
-            cursor.close()
-        if db:
-            db.close()
+        cursor.close()
+        db.close()
 
 
 # ---------- RUN SERVER ----------
 if __name__ == "__main__":
+    # Development server; in production run: gunicorn -c gunicorn.conf.py Backend:app
     print("Starting Flask server...")
     print("Server running on http://localhost:5000")
     print("Note: Set DB_PASSWORD environment variable to override default database password")
+    # debug=True runs the app in a child process restarted on code changes;
+    # warm up only there, not in the watching parent as well
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
     app.run(debug=True, host="0.0.0.0", port=5000)
 
 
@@ -0,0 +1,35 @@
+-- Sharded stock counters and cart reservations for hot SKUs (see inventory.py)
+USE mobile_shop;
+
+-- Flash-sale products whose stock is split across inventory_shards (see inventory.py)
+CREATE TABLE IF NOT EXISTS hot_skus (
+    product_id INT PRIMARY KEY,
+    shards INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS inventory_shards (
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    available INT NOT NULL,
+    PRIMARY KEY (product_id, shard),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_reservations_user_product (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+-- Verify tables were created
+SHOW TABLES;
+SHOW INDEX FROM reservations;
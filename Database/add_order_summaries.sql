@@ -0,0 +1,46 @@
+-- Order history: per-order summary table plus the (user_id, created_at) indexes
+USE mobile_shop;
+
+CREATE INDEX idx_orders_user_created ON orders (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS order_summaries (
+    order_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    order_date DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    item_count INT NOT NULL,
+    items JSON NOT NULL,
+    payment_status VARCHAR(50) NOT NULL DEFAULT 'Unpaid',
+    payment_method VARCHAR(50) DEFAULT NULL,
+    payment_date DATE DEFAULT NULL,
+    INDEX idx_order_summaries_user_created (user_id, created_at, order_id),
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE
+);
+
+-- Backfill existing orders; the latest payment decides the payment columns
+INSERT INTO order_summaries
+    (order_id, user_id, created_at, order_date, status, total_amount, item_count, items,
+     payment_status, payment_method, payment_date)
+SELECT o.order_id, o.user_id, o.created_at, o.order_date, o.status, o.total_amount,
+       COALESCE(i.item_count, 0), COALESCE(i.items, JSON_ARRAY()),
+       COALESCE(p.payment_status, 'Unpaid'), p.payment_method, p.payment_date
+FROM orders o
+LEFT JOIN (
+    SELECT oi.order_id, SUM(oi.quantity) AS item_count,
+           JSON_ARRAYAGG(JSON_OBJECT(
+               'product_id', oi.product_id, 'name', pr.name, 'quantity', oi.quantity, 'price', oi.price
+           )) AS items
+    FROM order_items oi
+    LEFT JOIN products pr ON pr.product_id = oi.product_id
+    GROUP BY oi.order_id
+) i ON i.order_id = o.order_id
+LEFT JOIN payments p ON p.payment_id = (
+    SELECT MAX(payment_id) FROM payments WHERE order_id = o.order_id
+)
+ON DUPLICATE KEY UPDATE order_id = order_summaries.order_id;
+
+-- Verify
+SELECT COUNT(*) AS orders, (SELECT COUNT(*) FROM order_summaries) AS summaries FROM orders;
+SHOW INDEX FROM order_summaries;
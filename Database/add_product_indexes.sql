@@ -0,0 +1,10 @@
+-- Indexes backing the paginated/filtered /products listing
+USE mobile_shop;
+
+CREATE INDEX idx_products_price ON products (price, product_id);
+CREATE INDEX idx_products_stock ON products (quantity, product_id);
+CREATE INDEX idx_products_created ON products (created_at, product_id);
+CREATE INDEX idx_products_name ON products (name, product_id);
+
+-- Verify indexes were created
+SHOW INDEX FROM products;
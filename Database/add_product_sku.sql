@@ -0,0 +1,8 @@
+-- Add a unique sku to products so bulk loads can upsert supplier rows
+USE mobile_shop;
+
+ALTER TABLE products
+    ADD COLUMN sku VARCHAR(64) UNIQUE AFTER product_id;
+
+-- Verify column was added
+DESCRIBE products;
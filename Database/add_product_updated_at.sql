@@ -0,0 +1,10 @@
+-- Add updated_at to products so the API can send Last-Modified headers
+USE mobile_shop;
+
+ALTER TABLE products
+    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+UPDATE products SET updated_at = created_at;
+
+-- Verify column was added
+DESCRIBE products;
@@ -12,12 +12,18 @@ CREATE TABLE IF NOT EXISTS users (
 
 CREATE TABLE IF NOT EXISTS products (
     product_id INT AUTO_INCREMENT PRIMARY KEY,
+    sku VARCHAR(64) UNIQUE,
     name VARCHAR(100) NOT NULL,
     price DECIMAL(10, 2) NOT NULL,
     quantity INT NOT NULL,
     description TEXT,
     image VARCHAR(255),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_products_price (price, product_id),
+    INDEX idx_products_stock (quantity, product_id),
+    INDEX idx_products_created (created_at, product_id),
+    INDEX idx_products_name (name, product_id)
 );
 
 CREATE TABLE IF NOT EXISTS cart (
@@ -26,6 +32,7 @@ CREATE TABLE IF NOT EXISTS cart (
     product_id INT NOT NULL,
     quantity INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_cart_user_product (user_id, product_id),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 );
@@ -37,6 +44,7 @@ CREATE TABLE IF NOT EXISTS orders (
     total_amount DECIMAL(10, 2) NOT NULL,
     status VARCHAR(50) DEFAULT 'Placed',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_orders_user_created (user_id, created_at),
     FOREIGN KEY (user_id) REFERENCES users(user_id)
 );
 
@@ -59,6 +67,53 @@ CREATE TABLE IF NOT EXISTS payments (
     FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE
 );
 
+-- One row per order for the order history API, written in the same
+-- transaction as the order and its payments
+CREATE TABLE IF NOT EXISTS order_summaries (
+    order_id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    order_date DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    item_count INT NOT NULL,
+    items JSON NOT NULL,
+    payment_status VARCHAR(50) NOT NULL DEFAULT 'Unpaid',
+    payment_method VARCHAR(50) DEFAULT NULL,
+    payment_date DATE DEFAULT NULL,
+    INDEX idx_order_summaries_user_created (user_id, created_at, order_id),
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE
+);
+
+-- Flash-sale products whose stock is split across inventory_shards (see inventory.py)
+CREATE TABLE IF NOT EXISTS hot_skus (
+    product_id INT PRIMARY KEY,
+    shards INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS inventory_shards (
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    available INT NOT NULL,
+    PRIMARY KEY (product_id, shard),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_reservations_user_product (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
 CREATE TABLE IF NOT EXISTS contact_messages (
     message_id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT DEFAULT NULL,
@@ -0,0 +1,20 @@
+-- Merge duplicate cart lines and enforce one line per (user_id, product_id)
+USE mobile_shop;
+
+-- Fold every duplicate's quantity into the oldest line for that product
+UPDATE cart c
+JOIN (
+    SELECT MIN(cart_id) AS keep_id, SUM(quantity) AS total
+    FROM cart
+    GROUP BY user_id, product_id
+    HAVING COUNT(*) > 1
+) d ON c.cart_id = d.keep_id
+SET c.quantity = d.total;
+
+DELETE c FROM cart c
+JOIN cart k ON c.user_id = k.user_id AND c.product_id = k.product_id AND c.cart_id > k.cart_id;
+
+ALTER TABLE cart ADD UNIQUE KEY uq_cart_user_product (user_id, product_id);
+
+-- Verify index was created
+SHOW INDEX FROM cart;
@@ -0,0 +1,138 @@
+-- SQLite equivalent of database.sql, loaded by storage.SQLiteBackend.
+-- Keep the two files in step when the schema changes.
+-- Column types keep their MySQL names so DECIMAL / DATE / TIMESTAMP
+-- values come back as the same Python types as from mysql.connector.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE COLLATE NOCASE,
+    email VARCHAR(100) NOT NULL UNIQUE COLLATE NOCASE,
+    password VARCHAR(255) NOT NULL,
+    role TEXT DEFAULT 'customer' CHECK (role IN ('customer', 'employee', 'admin')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sku VARCHAR(64) UNIQUE,
+    name VARCHAR(100) NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    quantity INT NOT NULL,
+    description TEXT,
+    image VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (price, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_stock ON products (quantity, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_created ON products (created_at, product_id);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products (name, product_id);
+
+-- MySQL's ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS trg_products_updated_at
+AFTER UPDATE ON products
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE product_id = NEW.product_id;
+END;
+
+CREATE TABLE IF NOT EXISTS cart (
+    cart_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, product_id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    order_date DATE NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(50) DEFAULT 'Placed',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    price DECIMAL(10, 2) NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id)
+);
+
+CREATE TABLE IF NOT EXISTS payments (
+    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id INT NOT NULL,
+    payment_method VARCHAR(50) NOT NULL,
+    payment_status VARCHAR(50) DEFAULT 'Pending',
+    payment_date DATE,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS order_summaries (
+    order_id INTEGER PRIMARY KEY,
+    user_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    order_date DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    item_count INT NOT NULL,
+    items TEXT NOT NULL,
+    payment_status VARCHAR(50) NOT NULL DEFAULT 'Unpaid',
+    payment_method VARCHAR(50) DEFAULT NULL,
+    payment_date DATE DEFAULT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_summaries_user_created ON order_summaries (user_id, created_at, order_id);
+
+CREATE TABLE IF NOT EXISTS hot_skus (
+    product_id INTEGER PRIMARY KEY,
+    shards INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS inventory_shards (
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    available INT NOT NULL,
+    PRIMARY KEY (product_id, shard),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_reservations_user_product ON reservations (user_id, product_id);
+CREATE INDEX IF NOT EXISTS idx_reservations_expires ON reservations (expires_at);
+
+CREATE TABLE IF NOT EXISTS contact_messages (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT DEFAULT NULL,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    subject VARCHAR(200) NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT DEFAULT 'new' CHECK (status IN ('new', 'read', 'replied', 'archived')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE SET NULL
+);
@@ -0,0 +1,684 @@
+"""
+asyncio entry point for the API, alongside the threaded Flask app.
+
+    pip install aiohttp aiomysql
+    python async_server.py            # listens on ASYNC_PORT (default 5001)
+
+The high-traffic customer routes (signup, login, product listing and
+detail, cart add / view and the contact form) are native coroutines on
+an aiomysql pool of ASYNC_DB_POOL_SIZE connections, so a slow client or a
+slow query only costs a suspended coroutine, not a thread. Password
+hashing still runs in the process pool from password_hashing.py, waited
+on from a worker thread.
+
+Every other route (orders, checkout, admin, bulk ingest, streamed
+exports, ...) is handed to the Flask app in Backend.py on a thread pool,
+so both servers expose exactly the same URLs and JSON contracts and can
+be benchmarked against each other (benchmark.py --url).
+
+With DB_BACKEND=sqlite the native routes run the SQLite backend on worker
+threads instead of aiomysql, sharing the Flask app's database.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import timezone
+from functools import wraps
+import asyncio
+import hashlib
+import os
+import time
+
+from aiohttp import web
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+import Backend
+from auth_tokens import issue_token, verify_token
+from catalog_cache import catalog_cache
+from contact_queue import QueueFull
+from db_pool import PoolTimeout
+from image_pipeline import add_srcset
+from metrics import record_query, registry as metrics
+from password_hashing import HashingUnavailable, hash_password, verify_password
+from slow_query_log import current_route, slow_queries
+from storage import ER_DUP_ENTRY, Error, IntegrityError, translated_errors
+
+ASYNC_PORT = int(os.getenv("ASYNC_PORT", "5001"))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "50"))
+# Threads for hashing waits, contact spooling and the Flask fallback routes
+ASYNC_BLOCKING_THREADS = int(os.getenv("ASYNC_BLOCKING_THREADS", "32"))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Expose-Headers": "ETag, X-Next-Cursor",
+}
+
+
+# ---------- ASYNC DATABASE ----------
+class AsyncCursor:
+    """aiomysql DictCursor with driver errors re-raised as storage.Error"""
+
+    def __init__(self, database, raw):
+        self._database = database
+        self._raw = raw
+
+    async def execute(self, sql, params=()):
+        started = time.perf_counter()
+        failed = True
+        try:
+            with translated_errors(self._database):
+                await self._raw.execute(sql, tuple(params))
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            record_query(sql, elapsed, failed)
+            if elapsed >= slow_queries.threshold:
+                # aiomysql cursors are buffered, so the row count is already known;
+                # EXPLAIN runs on the Flask app's (synchronous) pool
+                slow_queries.record(sql, params, elapsed, self._raw.rowcount, Backend.database.explain, failed)
+
+    async def fetchone(self):
+        with translated_errors(self._database):
+            return await self._raw.fetchone()
+
+    async def fetchall(self):
+        with translated_errors(self._database):
+            return await self._raw.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+
+class AsyncConnection:
+    def __init__(self, database, raw):
+        self._database = database
+        self._raw = raw
+
+    async def cursor(self):
+        return AsyncCursor(self._database, await self._raw.cursor(self._database.cursor_class))
+
+    async def commit(self):
+        with translated_errors(self._database):
+            await self._raw.commit()
+
+    async def rollback(self):
+        with translated_errors(self._database):
+            await self._raw.rollback()
+
+
+class AsyncMySQL:
+    name = "mysql"
+
+    def __init__(self, config, size, timeout):
+        import aiomysql
+        import pymysql
+        self._aiomysql = aiomysql
+        self.driver_error = pymysql.err.Error
+        self._integrity_error = pymysql.err.IntegrityError
+        self.cursor_class = aiomysql.DictCursor
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.pool = None
+
+    async def start(self):
+        self.pool = await self._aiomysql.create_pool(
+            host=self.config["host"], user=self.config["user"], password=self.config["password"],
+            db=self.config["database"], minsize=0, maxsize=self.size, autocommit=False
+        )
+
+    async def close(self):
+        self.pool.close()
+        await self.pool.wait_closed()
+
+    def convert_error(self, exc):
+        # PyMySQL errors carry (errno, message)
+        errno, msg = exc.args if len(exc.args) == 2 else (None, str(exc))
+        cls = IntegrityError if isinstance(exc, self._integrity_error) else Error
+        return cls(msg, errno)
+
+    @asynccontextmanager
+    async def connection(self):
+        try:
+            raw = await asyncio.wait_for(self.pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No async connection free within {self.timeout}s")
+        except self.driver_error as e:
+            raise self.convert_error(e) from e
+        try:
+            yield AsyncConnection(self, raw)
+        finally:
+            try:
+                if raw.get_transaction_status():
+                    await raw.rollback()
+            except self.driver_error:
+                raw.close()
+            self.pool.release(raw)
+
+    def stats(self):
+        return {"size": self.pool.size, "idle": self.pool.freesize, "max": self.pool.maxsize}
+
+
+class ThreadedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, sql, params=()):
+        await asyncio.to_thread(self._cursor.execute, sql, params)
+
+    async def fetchone(self):
+        return await asyncio.to_thread(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await asyncio.to_thread(self._cursor.fetchall)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class ThreadedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def cursor(self):
+        return ThreadedCursor(self._conn.cursor())
+
+    async def commit(self):
+        await asyncio.to_thread(self._conn.commit)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._conn.rollback)
+
+
+class ThreadedDatabase:
+    """Runs a synchronous storage backend (SQLite) on worker threads"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await asyncio.to_thread(self.backend.connect)
+        try:
+            yield ThreadedConnection(conn)
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def create_async_database():
+    if Backend.database.name == "mysql":
+        return AsyncMySQL(Backend.database.config, ASYNC_DB_POOL_SIZE, float(os.getenv('DB_POOL_TIMEOUT', '5')))
+    return ThreadedDatabase(Backend.database)
+
+
+db = create_async_database()
+
+
+# ---------- HELPERS ----------
+def json_response(payload, status=200):
+    return web.Response(body=Backend.app.json.dumps_bytes(payload), status=status,
+                        content_type="application/json")
+
+async def json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+def wants_stream(request):
+    return request.query.get("stream", "").lower() in ("1", "true", "yes")
+
+def auth_required(handler):
+    """aiohttp counterpart of auth_tokens.require_auth(); sets request["user"]"""
+    @wraps(handler)
+    async def wrapper(request):
+        header = request.headers.get("Authorization", "")
+        claims = verify_token(header[7:]) if header.startswith("Bearer ") else None
+        if claims is None:
+            return json_response({"message": "Authentication required"}, 401)
+        request["user"] = {"user_id": claims["uid"], "role": claims["role"]}
+        return await handler(request)
+    return wrapper
+
+def can_act_for(request, user_id):
+    user = request["user"]
+    return user["role"] == "admin" or user["user_id"] == user_id
+
+def conditional_json(request, body, etag, last_modified=None):
+    """Same validators as Backend.conditional_json: strong ETag plus Last-Modified"""
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+    if request.if_none_match is not None:
+        not_modified = any(tag.value == etag for tag in request.if_none_match)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(since and last_modified and last_modified <= since)
+    response = web.Response(status=304) if not_modified else \
+        web.Response(body=body, content_type="application/json")
+    response.etag = etag
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+# ---------- FLASK FALLBACK ----------
+def _call_flask(method, path, query_string, headers, body, remote_addr):
+    """Run a request through the Flask app.
+
+    Returns (status, headers, body, None) for ordinary responses, or
+    (status, headers, None, app_iter) for streamed ones (no
+    Content-Length, e.g. ?stream=1); the caller then iterates and closes
+    ``app_iter`` so they are never held in memory whole.
+    """
+    environ = EnvironBuilder(
+        path=path, method=method, query_string=query_string, headers=headers, data=body,
+        environ_base={"REMOTE_ADDR": remote_addr or ""}
+    ).get_environ()
+    app_iter, status, response_headers = run_wsgi_app(Backend.app.wsgi_app, environ, buffered=False)
+    status = int(status.split(" ", 1)[0])
+    if "Content-Length" not in response_headers:
+        return status, list(response_headers.items()), None, app_iter
+    try:
+        return status, list(response_headers.items()), b"".join(app_iter), None
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+
+async def flask_fallback(request):
+    """Serve any route without a native handler through the Flask app"""
+    body = await request.read()
+    status, headers, payload, app_iter = await run_blocking(
+        _call_flask, request.method, request.path, request.query_string,
+        list(request.headers.items()), body, request.remote
+    )
+    if app_iter is None:
+        response = web.Response(status=status, body=payload)
+    else:
+        response = web.StreamResponse(status=status)
+    for name, value in headers:
+        if name.lower() not in ("content-length", "transfer-encoding", "connection"):
+            response.headers.add(name, value)
+    if app_iter is None:
+        return response
+
+    # Pull the body one chunk at a time on the executor (it reads the database)
+    chunks = iter(app_iter)
+    try:
+        await response.prepare(request)
+        while True:
+            chunk = await run_blocking(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await response.write(chunk)
+        await response.write_eof()
+    finally:
+        # also on client disconnect: returns the pooled connection
+        if hasattr(app_iter, "close"):
+            await run_blocking(app_iter.close)
+    return response
+
+
+# ---------- USER SIGNUP ----------
+async def signup(request):
+    try:
+        data = await json_body(request)
+        if not data:
+            return json_response({"success": False, "message": "Invalid request"}, 400)
+
+        required_fields = ["username", "email", "password"]
+        if not all(field in data for field in required_fields):
+            return json_response({"success": False, "message": "Username, email, and password are required"}, 400)
+
+        username = data["username"].strip()
+        email = data["email"].strip()
+        if "@" in username:
+            return json_response({"success": False, "message": "Username cannot contain '@'"}, 400)
+
+        hashed_password = await run_blocking(hash_password, data["password"])
+
+        async with db.connection() as conn:
+            cursor = await conn.cursor()
+            try:
+                await cursor.execute(
+                    "INSERT INTO users (username, email, password, role) VALUES (%s, %s, %s, 'customer')",
+                    (username, email, hashed_password)
+                )
+                await conn.commit()
+            except IntegrityError as e:
+                await conn.rollback()
+                if e.errno != ER_DUP_ENTRY:
+                    raise
+                if Backend.duplicate_key_column(e) == "email":
+                    return json_response({"success": False, "message": "Email already exists"}, 400)
+                return json_response({"success": False, "message": "Username already exists"}, 400)
+            user = {"user_id": cursor.lastrowid, "username": username, "email": email, "role": "customer"}
+        # Fallback routes read through the sync pool's replicas
+        Backend.database.mark_write(f"login:{username}")
+        Backend.database.mark_write(f"login:{email}")
+
+        return json_response({
+            "success": True,
+            "message": "Account created successfully",
+            "user": user,
+            "token": issue_token(user["user_id"], user["role"])
+        }, 201)
+    except HashingUnavailable as e:
+        print(f"Hashing error: {e}")
+        return json_response({"success": False, "message": "Server busy, please try again"}, 503)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"success": False, "message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"success": False, "message": "Server error"}, 500)
+
+
+# ---------- USER LOGIN ----------
+async def login(request):
+    try:
+        data = await json_body(request)
+        if not data or "username" not in data or "password" not in data:
+            return json_response({"success": False, "message": "Username and password required"}, 400)
+
+        login_identifier = data["username"].strip()
+        column = "email" if "@" in login_identifier else "username"
+        async with db.connection() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute(f"SELECT * FROM users WHERE {column}=%s", (login_identifier,))
+            user = await cursor.fetchone()
+
+        if not user:
+            return json_response({"success": False, "message": "Invalid credentials"}, 401)
+
+        matches, new_hash = await run_blocking(verify_password, user['password'], data["password"])
+        if not matches:
+            return json_response({"success": False, "message": "Invalid credentials"}, 401)
+        if new_hash:
+            try:
+                async with db.connection() as conn:
+                    cursor = await conn.cursor()
+                    await cursor.execute("UPDATE users SET password=%s WHERE user_id=%s", (new_hash, user['user_id']))
+                    await conn.commit()
+            except (Error, PoolTimeout) as e:
+                print(f"Database error while rehashing password: {e}")
+        user.pop('password', None)
+        return json_response({"success": True, "user": user, "token": issue_token(user["user_id"], user["role"])})
+    except HashingUnavailable as e:
+        print(f"Hashing error: {e}")
+        return json_response({"success": False, "message": "Server busy, please try again"}, 503)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"success": False, "message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"success": False, "message": "Server error"}, 500)
+
+
+# ---------- PRODUCTS ----------
+async def get_products(request):
+    if wants_stream(request):
+        return await flask_fallback(request)
+    try:
+        try:
+            sql, params, page = Backend.build_product_query(request.query)
+        except ValueError as e:
+            return json_response({"message": str(e)}, 400)
+
+        cache_key = tuple(sorted(request.query.items()))
+        listing = catalog_cache.get_listing(cache_key)
+        if listing is None:
+            version = catalog_cache.version
+            async with db.connection() as conn:
+                cursor = await conn.cursor()
+                await cursor.execute(sql, params)
+                products = list(await cursor.fetchall())
+
+            next_cursor = None
+            if len(products) > page["limit"]:
+                products = products[:page["limit"]]
+                last = products[-1]
+                next_cursor = Backend.encode_cursor(last[page["sort_column"]], last["product_id"])
+
+            modified = [Backend._row_modified(p) for p in products if Backend._row_modified(p)]
+            body = Backend.app.json.dumps_bytes([add_srcset({f: p[f] for f in page["fields"]}) for p in products])
+            listing = {
+                "body": body,
+                "etag": hashlib.sha1(body).hexdigest(),
+                "last_modified": max(modified) if modified else None,
+                "next_cursor": next_cursor,
+            }
+            catalog_cache.store_listing(cache_key, listing, version)
+
+        response = conditional_json(request, listing["body"], listing["etag"], listing["last_modified"])
+        if listing["next_cursor"]:
+            response.headers["X-Next-Cursor"] = listing["next_cursor"]
+        return response
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"message": "Server error"}, 500)
+
+
+async def get_product(request):
+    try:
+        product_id = int(request.match_info["product_id"])
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            version = catalog_cache.version
+            async with db.connection() as conn:
+                cursor = await conn.cursor()
+                await cursor.execute("SELECT * FROM products WHERE product_id=%s", (product_id,))
+                product = await cursor.fetchone()
+            if not product:
+                return json_response({"message": "Product not found"}, 404)
+            catalog_cache.store_product(product, version)
+        body = Backend.app.json.dumps_bytes(add_srcset(product))
+        return conditional_json(request, body, hashlib.sha1(body).hexdigest(), Backend._row_modified(product))
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"message": "Server error"}, 500)
+
+
+# ---------- CART ----------
+async def cached_product(cursor, product_id):
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        version = catalog_cache.version
+        await cursor.execute("SELECT * FROM products WHERE product_id=%s", (product_id,))
+        product = await cursor.fetchone()
+        if product:
+            catalog_cache.store_product(product, version)
+    return product
+
+@auth_required
+async def add_to_cart(request):
+    try:
+        data = await json_body(request)
+        if not data:
+            return json_response({"message": "Invalid request"}, 400)
+
+        required_fields = ["product_id", "quantity"]
+        if not all(field in data for field in required_fields):
+            return json_response({"message": "Missing required fields"}, 400)
+        if type(data["product_id"]) is not int or type(data["quantity"]) is not int \
+                or data["quantity"] <= 0:
+            return json_response({"message": "product_id must be an integer and quantity a positive integer"}, 400)
+        user_id = data.get("user_id", request["user"]["user_id"])
+        if not can_act_for(request, user_id):
+            return json_response({"message": "Not allowed for this user"}, 403)
+
+        if Backend.inventory.is_hot(data["product_id"]):
+            # reservations against sharded stock live in the sync code (inventory.py)
+            return await flask_fallback(request)
+
+        async with db.connection() as conn:
+            cursor = await conn.cursor()
+            product = await cached_product(cursor, data["product_id"])
+            if not product:
+                return json_response({"message": "Product not found"}, 404)
+            if product["quantity"] < data["quantity"]:
+                return json_response({"message": "Insufficient stock"}, 400)
+
+            await cursor.execute(
+                "INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, %s)" + Backend.CART_UPSERT_ADD,
+                (user_id, data["product_id"], data["quantity"])
+            )
+            await conn.commit()
+        Backend.database.mark_write(user_id)
+        return json_response({"message": "Added to cart"}, 201)
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"message": "Server error"}, 500)
+
+
+@auth_required
+async def view_cart(request):
+    if wants_stream(request):
+        return await flask_fallback(request)
+    try:
+        user_id = int(request.match_info["user_id"])
+        if not can_act_for(request, user_id):
+            return json_response({"message": "Not allowed for this user"}, 403)
+
+        async with db.connection() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+            SELECT c.cart_id, c.product_id, p.name, p.price, c.quantity
+            FROM cart c
+            JOIN products p ON c.product_id = p.product_id
+            WHERE c.user_id=%s
+            """, (user_id,))
+            cart_items = await cursor.fetchall()
+        return json_response(list(cart_items))
+    except (Error, PoolTimeout) as e:
+        print(f"Database error: {e}")
+        return json_response({"message": "Database error"}, 500)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"message": "Server error"}, 500)
+
+
+# ---------- CONTACT FORM ----------
+async def contact(request):
+    """Same contract as Backend.contact(): 202 without a message_id"""
+    try:
+        data = await json_body(request)
+        if not data:
+            return json_response({"success": False, "message": "Invalid request"}, 400)
+
+        required_fields = ["name", "email", "subject", "message"]
+        if not all(field in data for field in required_fields):
+            return json_response({"success": False, "message": "All fields are required"}, 400)
+
+        name = data["name"].strip()
+        email = data["email"].strip()
+        subject = data["subject"].strip()
+        message = data["message"].strip()
+        user_id = data.get("user_id")
+
+        if not Backend.EMAIL_PATTERN.match(email):
+            return json_response({"success": False, "message": "Invalid email format"}, 400)
+        if len(name) > 100 or len(email) > 100 or len(subject) > 200:
+            return json_response({"success": False, "message": "Name, email or subject is too long"}, 400)
+        if user_id is not None and not isinstance(user_id, int):
+            return json_response({"success": False, "message": "Invalid user_id"}, 400)
+
+        # submit() fsyncs the spool, so keep it off the event loop
+        await run_blocking(Backend.contact_queue.submit, user_id, name, email, subject, message)
+
+        return json_response({
+            "success": True,
+            "message": "Your message has been sent successfully. We'll get back to you soon!"
+        }, 202)
+    except QueueFull as e:
+        print(f"Contact queue error: {e}")
+        return json_response({"success": False, "message": "Server busy, please try again"}, 503)
+    except Exception as e:
+        print(f"Server error: {e}")
+        return json_response({"success": False, "message": "Server error"}, 500)
+
+
+# ---------- APP ----------
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Fallback routes are timed by the Flask app's own hooks
+    if request.match_info.handler is flask_fallback:
+        return await handler(request)
+    route = request.match_info.route.resource.canonical
+    current_route.set(f"{request.method} {route}")
+    started = time.perf_counter()
+    response = await handler(request)
+    labels = (("method", request.method), ("route", route))
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - started, labels)
+    metrics.inc("http_requests_total", labels + (("status", str(response.status)),))
+    return response
+
+@web.middleware
+async def cors_middleware(request, handler):
+    # Flask-CORS already adds these to fallback responses
+    response = await handler(request)
+    for name, value in CORS_HEADERS.items():
+        response.headers.setdefault(name, value)
+    return response
+
+async def _startup(app):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(ASYNC_BLOCKING_THREADS))
+    await db.start()
+    try:
+        await run_blocking(Backend.contact_queue.start)
+    except OSError as e:
+        print(f"Could not start the contact queue: {e}")
+
+async def _cleanup(app):
+    await db.close()
+
+def make_app():
+    app = web.Application(middlewares=[cors_middleware, metrics_middleware])
+    app.router.add_post("/signup", signup)
+    app.router.add_post("/login", login)
+    app.router.add_get("/products", get_products)
+    app.router.add_get(r"/products/{product_id:\d+}", get_product)
+    app.router.add_post("/cart/add", add_to_cart)
+    app.router.add_get(r"/cart/{user_id:\d+}", view_cart)
+    app.router.add_post("/api/contact", contact)
+    # Everything else (and CORS preflights) goes to the Flask app
+    app.router.add_route("*", "/{tail:.*}", flask_fallback)
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    print(f"Starting asyncio server on http://localhost:{ASYNC_PORT}")
+    web.run_app(make_app(), host="0.0.0.0", port=ASYNC_PORT)
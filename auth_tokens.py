@@ -0,0 +1,86 @@
+"""
+Stateless signed session tokens.
+
+login(), signup() and google_signin() hand out "<payload>.<signature>"
+tokens: payload is base64url JSON {"uid", "role", "exp"} and signature an
+HMAC-SHA256 of it under AUTH_SECRET. Routes decorated with require_auth()
+check the token in memory, so identifying the caller costs no DB query.
+"""
+from functools import wraps
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from flask import g, jsonify, request
+
+TOKEN_TTL = int(os.getenv("AUTH_TOKEN_TTL", str(24 * 60 * 60)))
+
+SECRET = os.getenv("AUTH_SECRET", "").encode()
+if not SECRET:
+    # Tokens then only survive until restart and only work on this process
+    print("Warning: AUTH_SECRET is not set, using a random per-process token secret")
+    SECRET = os.urandom(32)
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user_id, role, ttl=TOKEN_TTL):
+    claims = {"uid": user_id, "role": role or "customer", "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token):
+    """Return the token's claims, or None if it is malformed, forged or expired"""
+    try:
+        payload, signature = token.split(".")
+        # bytes, since compare_digest rejects non-ASCII str with TypeError
+        if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+            return None
+    except (AttributeError, ValueError):  # includes UnicodeEncodeError
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+def require_auth(role=None):
+    """Reject requests without a valid bearer token (or without ``role``).
+
+    The caller is then available as g.user = {"user_id": ..., "role": ...}.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get("Authorization", "")
+            claims = verify_token(header[7:]) if header.startswith("Bearer ") else None
+            if claims is None:
+                return jsonify({"message": "Authentication required"}), 401
+            if role and claims["role"] != role:
+                return jsonify({"message": "Forbidden"}), 403
+            g.user = {"user_id": claims["uid"], "role": claims["role"]}
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def can_act_for(user_id):
+    """Whether the authenticated caller may read or change ``user_id``'s data"""
+    return g.user["role"] == "admin" or g.user["user_id"] == user_id
@@ -0,0 +1,343 @@
+"""
+Load-testing and benchmark harness for the Backend.py API.
+
+Seeds users, products and carts, then drives a weighted mix of scenarios
+from N concurrent workers and reports per-endpoint p50/p95/p99 latency,
+requests/sec and error rates.
+
+In-process (default): runs the app through Flask's test client on an
+in-memory SQLite database, so it needs no servers at all:
+
+    python benchmark.py --mix mixed --concurrency 16 --duration 30
+
+Live server:
+
+    python benchmark.py --url http://localhost:5000 --admin-user admin --admin-password ...
+
+Results can be saved as JSON and compared against an earlier run:
+
+    python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+SCENARIO_MIXES = {
+    "mixed": {"browse": 60, "add_to_cart": 20, "checkout": 5, "login": 10, "contact": 5},
+    "browse": {"browse": 100},
+    "checkout": {"add_to_cart": 50, "checkout": 50},
+    "login-storm": {"login": 100},
+    "contact-spam": {"contact": 100},
+}
+
+PASSWORD = "bench-password"
+
+
+# ---------- CLIENTS ----------
+class InProcessClient:
+    """Calls the Flask app directly; one test client per worker thread"""
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        data = response.get_json(silent=True)
+        response.close()
+        return response.status_code, data
+
+
+class HTTPClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+
+# ---------- RESULTS ----------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            entry = self.samples.setdefault(endpoint, {"latencies": [], "statuses": {}})
+            entry["latencies"].append(seconds)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    total_requests = total_errors = 0
+    for endpoint, entry in sorted(recorder.samples.items()):
+        latencies = sorted(entry["latencies"])
+        count = len(latencies)
+        # 5xx and transport failures are errors; 4xx (e.g. out of stock) are expected outcomes
+        errors = sum(n for status, n in entry["statuses"].items() if status == 0 or status >= 500)
+        total_requests += count
+        total_errors += errors
+        endpoints[endpoint] = {
+            "requests": count,
+            "rps": round(count / elapsed, 2),
+            "error_rate": round(errors / count, 4),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(sum(latencies) / count * 1000, 2),
+            "statuses": {str(status): n for status, n in sorted(entry["statuses"].items())},
+        }
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total_requests,
+        "rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(summary):
+    print(f"\n{'endpoint':<28}{'reqs':>8}{'rps':>10}{'err%':>8}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<28}{stats['requests']:>8}{stats['rps']:>10}{stats['error_rate'] * 100:>8.2f}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"\nTotal: {summary['requests']} requests in {summary['elapsed_s']}s, "
+          f"{summary['rps']} req/s, {summary['error_rate'] * 100:.2f}% errors")
+
+
+def compare(summary, baseline, threshold):
+    """Print per-endpoint p95 changes; return True if any regressed past ``threshold``"""
+    regressed = False
+    print(f"\n{'endpoint':<28}{'base p95':>10}{'p95':>10}{'change':>10}")
+    for endpoint, stats in summary["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before or not before["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        flag = "  REGRESSION" if change > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{endpoint:<28}{before['p95_ms']:>10}{stats['p95_ms']:>10}{change * 100:>9.1f}%{flag}")
+    return regressed
+
+
+# ---------- WORKLOAD ----------
+class Benchmark:
+    def __init__(self, client, recorder, rng_seed=None):
+        self.client = client
+        self.recorder = recorder
+        self.users = []
+        self.product_ids = []
+        self.rng_seed = rng_seed
+
+    def call(self, endpoint, method, path, body=None, token=None):
+        started = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, token)
+        except Exception as e:
+            print(f"Request error on {endpoint}: {e}")
+            status, data = 0, None
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+        return status, data
+
+    def seed(self, users, products, admin_token=None, cart_items=2):
+        run = uuid.uuid4().hex[:8]
+        if admin_token and products:
+            rows = [{"sku": f"bench-{run}-{i}", "name": f"Bench phone {i}", "price": round(random.uniform(100, 2000), 2),
+                     "quantity": 1_000_000, "description": "Benchmark product " * 20} for i in range(products)]
+            for start in range(0, len(rows), 1000):
+                self.client.request("POST", "/products/bulk", rows[start:start + 1000], admin_token)
+
+        # Spread traffic over the first page of in-stock products
+        status, page = self.client.request("GET", "/products?fields=product_id&in_stock=1&limit=200")
+        if status == 200 and page:
+            self.product_ids = [p["product_id"] for p in page]
+        if not self.product_ids:
+            sys.exit("No products to benchmark against; seed some with --admin-user/--admin-password")
+
+        for i in range(users):
+            username = f"bench_{run}_{i}"
+            status, data = self.client.request("POST", "/signup", {
+                "username": username, "email": f"{username}@bench.local", "password": PASSWORD
+            })
+            if status != 201:
+                print(f"Seeding user {username} failed: {status} {data}")
+                continue
+            user = {"username": username, "token": data["token"], "user_id": data["user"]["user_id"]}
+            self.users.append(user)
+            for product_id in random.sample(self.product_ids, min(cart_items, len(self.product_ids))):
+                self.client.request("POST", "/cart/add", {"product_id": product_id, "quantity": 1}, user["token"])
+        if not self.users:
+            sys.exit("No users could be seeded")
+        print(f"Seeded {len(self.users)} users against {len(self.product_ids)} products")
+
+    # one method per scenario; each may issue several requests
+    def browse(self, rng):
+        self.call("GET /products", "GET", f"/products?limit=20&sort={rng.choice(['id', 'price_asc', 'newest'])}")
+        self.call("GET /products/<id>", "GET", f"/products/{rng.choice(self.product_ids)}")
+
+    def add_to_cart(self, rng):
+        user = rng.choice(self.users)
+        self.call("POST /cart/add", "POST", "/cart/add",
+                  {"product_id": rng.choice(self.product_ids), "quantity": 1}, user["token"])
+        self.call("GET /cart/<user_id>", "GET", f"/cart/{user['user_id']}", token=user["token"])
+
+    def checkout(self, rng):
+        user = rng.choice(self.users)
+        self.call("POST /cart/add", "POST", "/cart/add",
+                  {"product_id": rng.choice(self.product_ids), "quantity": 1}, user["token"])
+        self.call("POST /checkout", "POST", "/checkout", {"method": "UPI"}, user["token"])
+
+    def login(self, rng):
+        user = rng.choice(self.users)
+        self.call("POST /login", "POST", "/login", {"username": user["username"], "password": PASSWORD})
+
+    def contact(self, rng):
+        self.call("POST /api/contact", "POST", "/api/contact", {
+            "name": "Bench", "email": "bench@bench.local",
+            "subject": "Benchmark", "message": "Load test message " * rng.randint(1, 20)
+        })
+
+    def run(self, weights, concurrency, duration=None, total_requests=None):
+        scenarios = [getattr(self, name.replace("-", "_")) for name in weights]
+        cum_weights = []
+        running = 0
+        for weight in weights.values():
+            running += weight
+            cum_weights.append(running)
+
+        stop_at = time.monotonic() + duration if duration else None
+        budget = {"left": total_requests}
+        budget_lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(None if self.rng_seed is None else self.rng_seed + index)
+            while True:
+                if stop_at and time.monotonic() >= stop_at:
+                    return
+                if total_requests is not None:
+                    with budget_lock:
+                        if budget["left"] <= 0:
+                            return
+                        budget["left"] -= 1
+                rng.choices(scenarios, cum_weights=cum_weights)[0](rng)
+
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started
+
+
+def parse_weights(text):
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the mobile shop API")
+    parser.add_argument("--url", help="Base URL of a live server (default: in-process test client)")
+    parser.add_argument("--mix", choices=sorted(SCENARIO_MIXES), default="mixed", help="Named scenario mix")
+    parser.add_argument("--weights", help="Custom mix, e.g. browse=70,add_to_cart=20,checkout=10")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="Stop after this many scenario iterations")
+    parser.add_argument("--users", type=int, default=50, help="Users to seed")
+    parser.add_argument("--products", type=int, default=200, help="Products to seed")
+    parser.add_argument("--admin-user", help="Admin login used to seed products on a live server")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible scenario choices")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p95 increase counted as a regression")
+    args = parser.parse_args()
+
+    weights = parse_weights(args.weights) if args.weights else SCENARIO_MIXES[args.mix]
+    unknown = [name for name in weights if not hasattr(Benchmark, name.replace("-", "_"))]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    recorder = Recorder()
+    admin_token = None
+    if args.url:
+        client = HTTPClient(args.url)
+        if args.admin_user:
+            status, data = client.request("POST", "/login", {"username": args.admin_user, "password": args.admin_password})
+            if status != 200:
+                sys.exit(f"Admin login failed: {status} {data}")
+            admin_token = data["token"]
+    else:
+        # In-process runs default to an in-memory SQLite database
+        os.environ.setdefault("DB_BACKEND", "sqlite")
+        import Backend
+        from auth_tokens import issue_token
+        client = InProcessClient(Backend.app)
+        admin_token = issue_token(0, "admin")
+
+    bench = Benchmark(client, recorder, args.seed)
+    bench.seed(args.users, args.products, admin_token)
+
+    print(f"Running {weights} with {args.concurrency} workers...")
+    elapsed = bench.run(weights, args.concurrency, None if args.requests else args.duration, args.requests)
+    summary = summarize(recorder, elapsed)
+    summary["config"] = {
+        "target": args.url or "in-process",
+        "weights": weights,
+        "concurrency": args.concurrency,
+        "users": len(bench.users),
+        "products": len(bench.product_ids),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+    }
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(summary, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
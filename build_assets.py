@@ -0,0 +1,166 @@
+"""
+Build the front end for serving by Backend.py (see static_assets.py).
+
+Usage: python build_assets.py [--out dist]
+
+- script.js and every file under src/ are copied to assets/ under a
+  content-hash fingerprinted name (src/logo/dora.png ->
+  assets/src/logo/dora.3f9a1c02b7de.png), so they can be cached forever.
+- The HTML pages are copied with their src/href/url() references
+  rewritten to the fingerprinted URLs.
+- Text files get .gz (and .br when the optional ``brotli`` package is
+  installed) variants, compressed once here instead of per request.
+- manifest.json maps every served path to its file, ETag, content type
+  and precompressed variants.
+
+Rerun it whenever a page or asset changes; the output directory is
+replaced each time.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from urllib.parse import unquote
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT_DIR = os.path.join(SOURCE_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+ASSET_ROOTS = ("src",)
+ASSET_FILES = ("script.js",)
+COMPRESSIBLE = {".html", ".js", ".css", ".svg", ".json", ".txt", ".ico"}
+# References the rewriter leaves alone
+EXTERNAL_PREFIXES = ("http:", "https:", "//", "#", "data:", "mailto:", "javascript:")
+
+REFERENCE_PATTERN = re.compile(r"""\b(src|href)=(["'])([^"']+)\2""")
+CSS_URL_PATTERN = re.compile(r"""url\((["']?)(.+?)\1\)""")
+
+
+def _slug(part):
+    return re.sub(r"\s+", "-", part.strip())
+
+
+def _content_type(path):
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _precompress(out_dir, rel_path, data):
+    """Write smaller-than-original .br/.gz siblings; return {encoding: rel path}"""
+    if os.path.splitext(rel_path)[1].lower() not in COMPRESSIBLE:
+        return {}
+    variants = {}
+    candidates = [("gzip", ".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.insert(0, ("br", ".br", lambda: brotli.compress(data, quality=11)))
+    for encoding, suffix, compress in candidates:
+        compressed = compress()
+        if len(compressed) < len(data):
+            _write(os.path.join(out_dir, rel_path + suffix), compressed)
+            variants[encoding] = rel_path + suffix
+    return variants
+
+
+def _entry(out_dir, rel_path, data, immutable):
+    return {
+        "file": rel_path,
+        "etag": hashlib.sha256(data).hexdigest()[:16],
+        "content_type": _content_type(rel_path),
+        "encodings": _precompress(out_dir, rel_path, data),
+        "immutable": immutable,
+    }
+
+
+def source_assets(source_dir=SOURCE_DIR):
+    """Relative paths (forward slashes) of every fingerprinted asset"""
+    paths = [name for name in ASSET_FILES if os.path.isfile(os.path.join(source_dir, name))]
+    for root in ASSET_ROOTS:
+        for dirpath, _, filenames in os.walk(os.path.join(source_dir, root)):
+            for filename in filenames:
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), source_dir).replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def source_pages(source_dir=SOURCE_DIR):
+    return sorted(name for name in os.listdir(source_dir) if name.endswith(".html"))
+
+
+def rewrite_references(html, urls, page):
+    """Point src/href/url() references at fingerprinted URLs"""
+    lowered = {path.lower(): url for path, url in urls.items()}
+
+    def resolve(reference):
+        if reference.startswith(EXTERNAL_PREFIXES):
+            return None
+        path = unquote(reference.replace("\\ ", " ")).lstrip("./")
+        url = urls.get(path)
+        if url is None and path.lower() in lowered:
+            # e.g. "X 20 Phone.png" for "X 20 phone.png": works on Windows, 404s elsewhere
+            print(f"{page}: '{reference}' only matches an asset ignoring case")
+            url = lowered[path.lower()]
+        return url
+
+    def attribute(match):
+        url = resolve(match.group(3))
+        return match.group(0) if url is None else f"{match.group(1)}={match.group(2)}{url}{match.group(2)}"
+
+    def css_url(match):
+        url = resolve(match.group(2))
+        return match.group(0) if url is None else f"url('{url}')"
+
+    return CSS_URL_PATTERN.sub(css_url, REFERENCE_PATTERN.sub(attribute, html))
+
+
+def build(out_dir=DEFAULT_OUT_DIR, source_dir=SOURCE_DIR):
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    files = {}
+    urls = {}
+
+    for rel_path in source_assets(source_dir):
+        with open(os.path.join(source_dir, rel_path), "rb") as f:
+            data = f.read()
+        directory, filename = os.path.split(rel_path)
+        stem, ext = os.path.splitext(filename)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        out_rel = "/".join(["assets", *(_slug(p) for p in directory.split("/") if p), f"{_slug(stem)}.{digest}{ext}"])
+        _write(os.path.join(out_dir, out_rel), data)
+        files[out_rel] = _entry(out_dir, out_rel, data, immutable=True)
+        # the original path keeps working (product rows store it) but must be revalidated
+        files[rel_path] = {**files[out_rel], "immutable": False}
+        urls[rel_path] = "/" + out_rel
+
+    for page in source_pages(source_dir):
+        with open(os.path.join(source_dir, page), encoding="utf-8") as f:
+            html = rewrite_references(f.read(), urls, page)
+        data = html.encode("utf-8")
+        _write(os.path.join(out_dir, page), data)
+        files[page] = _entry(out_dir, page, data, immutable=False)
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump({"files": files, "assets": urls}, f, indent=2, sort_keys=True)
+    compressed = sum(1 for entry in files.values() if entry["encodings"])
+    print(f"Built {len(urls)} assets and {len(files) - 2 * len(urls)} pages into {out_dir} "
+          f"({compressed} with precompressed variants{'' if brotli else ', gzip only: brotli not installed'})")
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint, precompress and rewrite front-end assets")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="Output directory (replaced)")
+    args = parser.parse_args()
+    build(args.out)
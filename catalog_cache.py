@@ -0,0 +1,131 @@
+"""
+In-process product catalog cache.
+
+Product rows and serialized /products listing pages are kept in memory so
+browsing and cart stock checks don't need a pooled MySQL connection. The
+write paths in Backend.py (add_product, place_order) invalidate
+entries; everything else expires after CATALOG_CACHE_TTL seconds.
+"""
+from collections import OrderedDict
+import os
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ``ttl`` seconds"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CatalogCache:
+    """Product rows keyed by product_id plus pre-serialized listing pages.
+
+    Readers take ``version`` before querying MySQL and hand it back to the
+    ``store_*`` methods; a write that lands in between bumps the version so
+    the (possibly stale) result is not cached.
+
+    Reads may come from replicas that lag the primary. ``on_change`` runs
+    before every catalog write (products added or edited); Backend.py uses
+    it to keep refills on the primary until the replicas have the write.
+    Stock changes from orders are too frequent for that, so results read
+    within ``replica_lag`` seconds of one are served but not cached.
+    """
+
+    def __init__(self, max_entries=1000, ttl=60):
+        self.products = TTLCache(max_entries, ttl)
+        self.listings = TTLCache(max_entries, ttl)
+        self.version = 0
+        self.on_change = None
+        self.replica_lag = 0.0
+        self._stock_settles_at = 0.0
+        self._lock = threading.Lock()
+
+    def _bump(self, stock_only=False):
+        if stock_only:
+            self._stock_settles_at = time.monotonic() + self.replica_lag
+        elif self.on_change:
+            self.on_change()
+        with self._lock:
+            self.version += 1
+
+    def _storable(self, version):
+        return version == self.version and time.monotonic() >= self._stock_settles_at
+
+    def get_product(self, product_id):
+        return self.products.get(product_id)
+
+    def store_product(self, row, version):
+        if self._storable(version):
+            self.products.set(row["product_id"], row)
+
+    def get_listing(self, key):
+        return self.listings.get(key)
+
+    def store_listing(self, key, entry, version):
+        if self._storable(version):
+            self.listings.set(key, entry)
+
+    def product_added(self):
+        """A new row changes every listing page but no cached product"""
+        self._bump()
+        self.listings.clear()
+
+    def stock_changed(self, quantities):
+        """Drop the rows behind ``{product_id: delta}`` stock changes after a
+        committed order. The stored ``updated_at`` moved with the quantity, so
+        the rows are re-read rather than patched to keep Last-Modified honest."""
+        self._bump(stock_only=True)
+        for product_id in quantities:
+            self.products.pop(product_id)
+        self.listings.clear()
+
+    def invalidate_product(self, product_id):
+        self._bump()
+        self.products.pop(product_id)
+        self.listings.clear()
+
+    def clear(self):
+        self._bump()
+        self.products.clear()
+        self.listings.clear()
+
+
+catalog_cache = CatalogCache(
+    max_entries=int(os.getenv("CATALOG_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "60")),
+)
@@ -0,0 +1,215 @@
+"""
+Write-behind queue for contact-form submissions.
+
+/api/contact only validates a message and hands it to ContactQueue.submit();
+a background thread writes queued messages to contact_messages with one
+multi-row INSERT per batch, whenever CONTACT_BATCH_SIZE messages are
+waiting or CONTACT_FLUSH_INTERVAL seconds have passed. A burst of
+submissions therefore costs one pooled connection every so often instead
+of one per request.
+
+Every accepted message is first appended (and fsynced) to a JSON-lines
+spool file in CONTACT_SPOOL_DIR, and the spool is rewritten to hold only
+unwritten messages after each successful batch. Messages still in a
+spool when a process dies are replayed by the next process to start, so
+delivery is at-least-once: a crash between the commit and the spool
+rewrite can store a batch twice.
+"""
+from datetime import datetime
+import atexit
+import glob
+import json
+import os
+import threading
+
+from db_pool import PoolTimeout
+from storage import Error, IntegrityError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so only replay at startup
+    fcntl = None
+
+CONTACT_BATCH_SIZE = int(os.getenv("CONTACT_BATCH_SIZE", "100"))
+CONTACT_FLUSH_INTERVAL = float(os.getenv("CONTACT_FLUSH_INTERVAL", "1"))
+CONTACT_QUEUE_MAX = int(os.getenv("CONTACT_QUEUE_MAX", "10000"))
+CONTACT_SPOOL_DIR = os.getenv(
+    "CONTACT_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool")
+)
+
+CONTACT_COLUMNS = ("user_id", "name", "email", "subject", "message", "created_at")
+INSERT_PREFIX = f"INSERT INTO contact_messages ({', '.join(CONTACT_COLUMNS)}) VALUES "
+ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * len(CONTACT_COLUMNS)) + ")"
+
+
+class QueueFull(Exception):
+    """More than CONTACT_QUEUE_MAX messages are waiting (the database is probably down)"""
+
+
+class ContactQueue:
+    def __init__(self, database, spool_dir=CONTACT_SPOOL_DIR, batch_size=CONTACT_BATCH_SIZE,
+                 flush_interval=CONTACT_FLUSH_INTERVAL, max_pending=CONTACT_QUEUE_MAX):
+        self.database = database
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._spool = None
+        self._pid = None
+        self.counters = {"accepted": 0, "written": 0, "batches": 0, "dropped": 0, "failed_flushes": 0}
+
+    # ---------- SPOOL ----------
+    def _spool_path(self, pid):
+        return os.path.join(self.spool_dir, f"contact-{pid}.jsonl")
+
+    def start(self):
+        """Replay orphaned spools and start the flusher in this process now
+        rather than on the first submission; cheap when already running"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+
+    def _start(self):
+        """Open this process's spool, adopt orphaned ones and start the flusher.
+
+        Runs once in each process (called with self._lock held), so forked
+        workers get their own spool file and thread. ``_pid`` is only set
+        once the flusher is running, so a failed start is retried.
+        """
+        pid = os.getpid()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        if self._spool is not None:
+            self._spool.close()  # the parent's spool, inherited across fork
+        self._spool = open(self._spool_path(pid), "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self._spool, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._pending = []
+        for path in glob.glob(os.path.join(self.spool_dir, "contact-*.jsonl")):
+            try:
+                self._adopt(path, pid)
+            except FileNotFoundError:
+                pass  # adopted and removed by another worker since the glob
+        self._rewrite_spool()
+        threading.Thread(target=self._run, name="contact-queue", daemon=True).start()
+        self._pid = pid
+        atexit.register(self.flush)
+
+    def _adopt(self, path, pid):
+        """Queue the messages left in a spool whose owner is gone"""
+        own = path == self._spool_path(pid)
+        with open(path, encoding="utf-8") as f:
+            if fcntl is not None and not own:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return  # another live worker owns it
+                if os.fstat(f.fileno()).st_nlink == 0:
+                    return  # replayed and removed while we waited for the lock
+            for line in f:
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping corrupt line in {path}")
+        if not own:
+            os.remove(path)
+
+    def _write_spool(self, lines):
+        self._spool.write(lines)
+        self._spool.flush()
+        os.fsync(self._spool.fileno())
+
+    def _rewrite_spool(self):
+        # Called with self._lock held (or before the flusher starts)
+        self._spool.seek(0)
+        self._spool.truncate()
+        self._write_spool("".join(json.dumps(m) + "\n" for m in self._pending))
+
+    # ---------- QUEUE ----------
+    def submit(self, user_id, name, email, subject, message):
+        entry = {
+            "user_id": user_id, "name": name, "email": email, "subject": subject,
+            "message": message, "created_at": datetime.now().isoformat(" ", "seconds")
+        }
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull("Contact queue is full")
+            self._write_spool(json.dumps(entry) + "\n")
+            self._pending.append(entry)
+            self.counters["accepted"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far, one batch at a time"""
+        if self._pid != os.getpid():
+            return  # nothing submitted in this process yet
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    return
+                written = self._insert(batch)
+                if written is None:
+                    self.counters["failed_flushes"] += 1
+                    return  # database unavailable; the spool keeps the batch for the next try
+                with self._lock:
+                    # submit() only appends, so the batch is still at the front
+                    del self._pending[:len(batch)]
+                    self.counters["written"] += written
+                    self.counters["dropped"] += len(batch) - written
+                    self.counters["batches"] += 1
+                    self._rewrite_spool()
+
+    def _insert(self, batch):
+        """Insert a batch; return how many rows were stored, or None to retry later"""
+        db = None
+        cursor = None
+        try:
+            db = self.database.connect()
+            cursor = db.cursor()
+            rows = [tuple(entry[c] for c in CONTACT_COLUMNS) for entry in batch]
+            try:
+                cursor.execute(INSERT_PREFIX + ", ".join([ROW_PLACEHOLDER] * len(rows)),
+                               [value for row in rows for value in row])
+                db.commit()
+                return len(rows)
+            except IntegrityError:
+                # e.g. a user_id that no longer exists; store the rest one by one
+                db.rollback()
+            written = 0
+            for row in rows:
+                try:
+                    cursor.execute(INSERT_PREFIX + ROW_PLACEHOLDER, row)
+                    db.commit()
+                    written += 1
+                except IntegrityError as e:
+                    db.rollback()
+                    print(f"Dropping contact message from {row[2]}: {e}")
+            return written
+        except (Error, PoolTimeout) as e:
+            if db:
+                db.rollback()
+            print(f"Contact queue flush failed: {e}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if db:
+                db.close()
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._pending), **self.counters}
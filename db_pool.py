@@ -0,0 +1,202 @@
+"""
+Blocking, self-healing database connection pool.
+
+Unlike mysql.connector's MySQLConnectionPool, which raises as soon as all
+connections are busy, ConnectionPool.get() waits up to ``timeout`` seconds
+for one to come back. Connections are opened lazily, so the pool works
+even if the database was down when the app started. They are pinged
+after sitting idle, replaced once older than ``recycle`` seconds, and
+thrown away if they break while checked out.
+"""
+from collections import deque
+import threading
+import time
+
+from metrics import registry
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool timeout"""
+
+
+class PooledConnection:
+    """Proxy for a checked-out connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, record):
+        self._pool = pool
+        self._record = record
+
+    def __getattr__(self, name):
+        return getattr(self._record["conn"], name)
+
+    def close(self):
+        record, self._record = self._record, None
+        if record is not None:
+            self._pool._release(record)
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=10, timeout=5.0, recycle=1800.0, ping_after=30.0, name="primary"):
+        self._connect = connect
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.counters = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "connects": 0,
+            "connect_errors": 0,
+            "recycled": 0,
+            "broken": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def get(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        record = None
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    record = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # reserve a slot; the connect itself happens outside the lock
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection free after {timeout:.1f}s")
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self.counters["checkouts"] += 1
+            waited_for = time.monotonic() - started
+            if waited:
+                self.counters["waits"] += 1
+                self.counters["wait_seconds"] += waited_for
+        registry.observe("db_pool_wait_seconds", waited_for, (("pool", self.name),))
+
+        try:
+            if record is not None:
+                record = self._validate(record)
+            if record is None:
+                record = self._new_record()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self.counters["checkouts"] -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, record)
+
+    def _new_record(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            self._count("connect_errors")
+            raise
+        self._count("connects")
+        now = time.monotonic()
+        return {"conn": conn, "created": now, "last_used": now}
+
+    def _validate(self, record):
+        """Return a usable record, or None if it had to be dropped"""
+        now = time.monotonic()
+        if now - record["created"] > self.recycle:
+            self._count("recycled")
+            self._close_quietly(record["conn"])
+            return None
+        if now - record["last_used"] > self.ping_after:
+            try:
+                record["conn"].ping()
+            except Exception:
+                self._count("broken")
+                self._close_quietly(record["conn"])
+                return None
+        return record
+
+    def _release(self, record):
+        conn = record["conn"]
+        try:
+            # never hand the next caller an open transaction
+            if getattr(conn, "in_transaction", True):
+                conn.rollback()
+        except Exception:
+            self._close_quietly(conn)
+            with self._cond:
+                self.counters["broken"] += 1
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+        record["last_used"] = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(record)
+            self._cond.notify()
+
+    def _count(self, name):
+        with self._cond:
+            self.counters[name] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def warm_up(self, count):
+        """Open up to ``count`` connections now rather than on first use"""
+        opened = 0
+        while opened < count:
+            with self._cond:
+                if self._open >= self.size:
+                    break
+                self._open += 1
+            try:
+                record = self._new_record()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(record)
+                self._cond.notify()
+            opened += 1
+        return opened
+
+    def reset(self):
+        """Forget every connection without closing it.
+
+        For use in a freshly forked worker: the sockets belong to the parent,
+        and closing them here would end the parent's sessions too.
+        """
+        with self._cond:
+            self._idle = deque()
+            self._open = 0
+            self._in_use = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self.counters,
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            }
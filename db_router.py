@@ -0,0 +1,85 @@
+"""
+Read/write routing between a primary pool and optional replica pools.
+
+Callers mark a checkout as read-only to let it go to a replica (round
+robin). Writes call mark_write(key) after committing. For
+``sticky_seconds`` afterwards, read-only checkouts for the same key go
+to the primary again, so users always see their own cart and order
+writes despite replica lag. Any object with ConnectionPool's name and
+get/stats/reset/warm_up methods can be used as a pool, so stand-in
+backends work for tests.
+"""
+import itertools
+import threading
+import time
+
+MAX_STICKY_KEYS = 10000
+
+
+class DatabaseRouter:
+    def __init__(self, primary, replicas=(), sticky_seconds=5.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.sticky_seconds = sticky_seconds
+        self._next_replica = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._last_write = {}
+        self._lock = threading.Lock()
+        self.counters = {"primary_reads": 0, "replica_reads": 0, "replica_fallbacks": 0}
+
+    def mark_write(self, key):
+        if not self.replicas or key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._last_write[key] = now
+            if len(self._last_write) > MAX_STICKY_KEYS:
+                cutoff = now - self.sticky_seconds
+                self._last_write = {k: t for k, t in self._last_write.items() if t > cutoff}
+
+    def _sticky(self, key):
+        if key is None:
+            return False
+        with self._lock:
+            written = self._last_write.get(key)
+        return written is not None and time.monotonic() - written < self.sticky_seconds
+
+    def get(self, read_only=False, key=None):
+        """Check out a connection; read-only ones may come from a replica"""
+        if read_only and self.replicas:
+            if self._sticky(key):
+                self._count("primary_reads")
+            else:
+                with self._lock:
+                    replica = self.replicas[next(self._next_replica)]
+                try:
+                    conn = replica.get()
+                    self._count("replica_reads")
+                    return conn
+                except Exception as e:
+                    # a lagging or dead replica must not take reads down with it
+                    print(f"Replica unavailable, reading from primary: {e}")
+                    self._count("replica_fallbacks")
+        return self.primary.get()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def reset(self):
+        for pool in [self.primary, *self.replicas]:
+            pool.reset()
+
+    def pools(self):
+        return {pool.name: pool for pool in [self.primary, *self.replicas]}
+
+    def warm_up(self, count):
+        return sum(pool.warm_up(count) for pool in [self.primary, *self.replicas])
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **self.primary.stats(),
+            "routing": counters,
+            "replicas": [pool.stats() for pool in self.replicas],
+        }
@@ -0,0 +1,62 @@
+"""
+Production launcher for Backend.py:
+
+    AUTH_SECRET=... gunicorn -c gunicorn.conf.py Backend:app
+
+Pre-forks WEB_CONCURRENCY workers (default: one per CPU core), each with
+GUNICORN_THREADS threads sharing that worker's connection pools. Every
+worker builds its own pools after fork and runs Backend.warm_up() before
+it accepts connections; point the load balancer's health checks at
+/healthz (liveness) and /readyz (readiness).
+
+Graceful reload: ``kill -HUP <master pid>`` starts workers on the new code
+and lets the old ones finish in-flight requests (up to
+GUNICORN_GRACEFUL_TIMEOUT seconds) before they exit. ``kill -TERM`` drains
+the same way and then shuts down.
+"""
+import multiprocessing
+import os
+
+# One slow-query log per worker: size-based rotation from several processes
+# sharing one file loses entries (see slow_query_log.py)
+os.environ.setdefault(
+    "SLOW_QUERY_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_queries.{pid}.log")
+)
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+# Recycle workers now and then to cap slow leaks; 0 disables
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+# Off by default so HUP reloads pick up new code; with it on, the master
+# imports the app once and post_fork() drops the state forks can't share
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+accesslog = "-"
+
+
+def on_starting(server):
+    # A random per-process secret would make every worker reject the others' tokens
+    if not os.getenv("AUTH_SECRET"):
+        raise RuntimeError("AUTH_SECRET must be set so all workers accept the same tokens")
+
+
+def post_fork(server, worker):
+    import Backend
+    from metrics import registry
+    from password_hashing import hash_executor
+    # Sockets, hashing processes and counters inherited from a preloaded master
+    Backend.database.reset()
+    hash_executor.shutdown()
+    registry.reset()
+
+
+def post_worker_init(worker):
+    import Backend
+    from metrics import registry
+    Backend.warm_up()
+    registry.start_flusher()
@@ -0,0 +1,287 @@
+"""
+Responsive derivatives of product and slideshow images.
+
+Each source image (a ``products.image`` path such as
+"src/phone imges/Y phone.png", or any image under src/) is resized to
+every IMAGE_WIDTHS width that isn't wider than the original and saved as
+WebP and JPEG in IMAGE_CACHE_DIR (default media/):
+
+    media/<content hash>/320.webp  media/<content hash>/320.jpg  ...
+    media/<content hash>/meta.json (written last: the set is complete)
+
+The directory is named after a hash of the source bytes, so each distinct
+image is processed once, renaming a file costs nothing and Backend.py can
+serve /media/... with an immutable Cache-Control. Product JSON gets an
+``image_srcset`` object built from them (see add_srcset()).
+
+Derivatives are made in the background when a product is added, or by:
+
+    python image_pipeline.py              # every image under src/
+    python image_pipeline.py --products   # plus every products.image path
+
+Pillow is optional: without it nothing is generated and product JSON
+only has the original ``image``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import unquote
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # derivatives disabled
+    Image = None
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(SOURCE_DIR, "media"))
+IMAGE_URL_PREFIX = "/media"
+IMAGE_WIDTHS = tuple(sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "320,640,960,1280").split(",")))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+# width of the plain <img src> fallback for browsers without srcset
+FALLBACK_WIDTH = 640
+
+SOURCE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+# format -> (file extension, Pillow format)
+FORMATS = {"webp": ("webp", "WEBP"), "jpeg": ("jpg", "JPEG")}
+META_NAME = "meta.json"
+# an image path that didn't resolve is looked up again after this many seconds
+SOURCE_MISS_TTL = 60
+MAX_SOURCES = 4096
+
+_meta = {}  # content key -> meta.json contents; never change once written
+_sources = {}  # products.image value -> (absolute path or None, monotonic time resolved)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def source_path(image):
+    """Absolute path of a ``products.image`` value, or None (URL, missing, outside the app).
+
+    Every product in a listing goes through here, so results are cached;
+    misses only for SOURCE_MISS_TTL, so images copied in later are found.
+    """
+    if not image or image.startswith(("http:", "https:", "//", "data:")):
+        return None
+    cached = _sources.get(image)
+    if cached is not None and (cached[0] is not None or time.monotonic() - cached[1] < SOURCE_MISS_TTL):
+        return cached[0]
+    path = _resolve(image)
+    if len(_sources) >= MAX_SOURCES:
+        _sources.clear()
+    _sources[image] = (path, time.monotonic())
+    return path
+
+
+def _resolve(image):
+    for candidate in (image, unquote(image)):
+        path = os.path.realpath(os.path.join(SOURCE_DIR, candidate.lstrip("./")))
+        if path.startswith(SOURCE_DIR + os.sep) and os.path.isfile(path):
+            if os.path.splitext(path)[1].lower() in SOURCE_EXTENSIONS:
+                return path
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _hash_file(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def content_key(path):
+    """Hash of the file's bytes, recomputed only when its mtime or size changes"""
+    stat = os.stat(path)
+    return _hash_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+def _target_widths(original_width):
+    """Configured widths below the original, plus the original when it's smaller
+    than the largest one; images are never upscaled."""
+    widths = [w for w in IMAGE_WIDTHS if w < original_width]
+    widths.append(min(original_width, IMAGE_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def _flatten(image):
+    """RGB copy for JPEG, with any transparency composited onto white"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _save(image, path, fmt):
+    # write then rename, so concurrent workers never serve a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if fmt == "JPEG":
+        _flatten(image).save(tmp, fmt, quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image.convert("RGBA" if has_alpha else "RGB").save(tmp, fmt, quality=IMAGE_WEBP_QUALITY, method=6)
+    os.replace(tmp, path)
+
+
+def _read_meta(key):
+    meta = _meta.get(key)
+    if meta is None:
+        try:
+            with open(os.path.join(IMAGE_CACHE_DIR, key, META_NAME)) as f:
+                meta = _meta[key] = json.load(f)
+        except (OSError, ValueError):
+            return None
+    return meta
+
+
+def generate(image):
+    """Build the derivatives of one image if they don't exist yet.
+
+    Returns True when new files were written, False when they were
+    already there or the image can't be processed.
+    """
+    if Image is None:
+        return False
+    _sources.pop(image, None)  # the file may have been added since the last lookup
+    path = source_path(image)
+    if path is None:
+        return False
+    key = content_key(path)
+    if _read_meta(key) is not None:
+        return False
+
+    out_dir = os.path.join(IMAGE_CACHE_DIR, key)
+    os.makedirs(out_dir, exist_ok=True)
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    widths = _target_widths(original.width)
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for ext, fmt in FORMATS.values():
+            _save(resized, os.path.join(out_dir, f"{width}.{ext}"), fmt)
+
+    meta = {"width": original.width, "height": original.height, "widths": widths}
+    tmp = os.path.join(out_dir, f"{META_NAME}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(out_dir, META_NAME))
+    _meta[key] = meta
+    return True
+
+
+def srcset(image):
+    """srcset strings for an image's derivatives, or None if there are none (yet)"""
+    path = source_path(image)
+    if path is None:
+        return None
+    key = content_key(path)
+    meta = _read_meta(key)
+    if meta is None:
+        return None
+    base = f"{IMAGE_URL_PREFIX}/{key}"
+    widths = meta["widths"]
+    fallback = max([w for w in widths if w <= FALLBACK_WIDTH] or widths[:1])
+    sets = {
+        name: ", ".join(f"{base}/{w}.{ext} {w}w" for w in widths)
+        for name, (ext, _) in FORMATS.items()
+    }
+    return {**sets, "src": f"{base}/{fallback}.jpg", "width": meta["width"], "height": meta["height"]}
+
+
+def add_srcset(product):
+    """Product dict plus ``image_srcset`` when its image has derivatives.
+
+    Returns a new dict, so cached rows are never modified.
+    """
+    if Image is None or not product.get("image"):
+        return product
+    try:
+        sets = srcset(product["image"])
+    except OSError as e:
+        _sources.pop(product["image"], None)  # e.g. the file was deleted
+        print(f"Image lookup error for {product['image']}: {e}")
+        return product
+    return {**product, "image_srcset": sets} if sets else product
+
+
+def _generate_logged(image, on_done):
+    try:
+        if generate(image) and on_done:
+            on_done()
+    except Exception as e:
+        print(f"Image pipeline error for {image}: {e}")
+
+
+def submit(image, on_done=None):
+    """Generate derivatives on a background thread; ``on_done()`` runs if new ones were made"""
+    global _executor
+    if Image is None or not image:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-pipeline")
+    try:
+        _executor.submit(_generate_logged, image, on_done)
+    except RuntimeError as e:  # interpreter shutting down
+        print(f"Image pipeline unavailable: {e}")
+
+
+def source_images():
+    """Relative paths of every image under src/"""
+    paths = []
+    for dirpath, _, filenames in os.walk(os.path.join(SOURCE_DIR, "src")):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in SOURCE_EXTENSIONS:
+                paths.append(os.path.relpath(os.path.join(dirpath, filename), SOURCE_DIR).replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def product_images():
+    """Distinct non-empty products.image values"""
+    from storage import create_backend
+
+    database = create_backend()
+    db = database.connect(read_only=True)
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT DISTINCT image FROM products WHERE image IS NOT NULL AND image <> ''")
+        return [row["image"] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/JPEG image derivatives")
+    parser.add_argument("images", nargs="*", help="Image paths relative to the app (default: everything under src/)")
+    parser.add_argument("--products", action="store_true", help="Also process every products.image path")
+    args = parser.parse_args()
+
+    if Image is None:
+        parser.exit(1, "Pillow is not installed (pip install Pillow)\n")
+    images = args.images or source_images()
+    if args.products:
+        images += product_images()
+
+    created = skipped = failed = 0
+    for image in dict.fromkeys(images):
+        try:
+            if generate(image):
+                created += 1
+            else:
+                skipped += 1
+        except Exception as e:
+            failed += 1
+            print(f"{image}: {e}")
+    print(f"Derivatives built for {created} images into {IMAGE_CACHE_DIR} "
+          f"({skipped} already cached or not found, {failed} failed)")
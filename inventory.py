@@ -0,0 +1,455 @@
+"""
+Sharded stock counters and cart reservations for hot SKUs.
+
+During a flash sale every order for the same phone would otherwise lock
+and decrement the one products row. A product marked hot (POST
+/admin/hot-skus) instead has its stock split across ``shards`` rows of
+inventory_shards:
+
+- add-to-cart reserves units from a randomly chosen shard and records
+  them in reservations, which expire after INVENTORY_RESERVATION_TTL
+  seconds (adding the product again extends them); removing or lowering
+  the cart line gives the units back;
+- create_order() consumes the buyer's reservations, topping up from the
+  shards if they expired or the cart grew, and never locks the products
+  row;
+- a background thread in every process releases expired reservations
+  back to their shards, rebalances the shards and copies the remaining
+  stock into products.quantity (used for listings only) every
+  INVENTORY_RECONCILE_INTERVAL seconds;
+- bulk ingest (product_ingest.py) restocks a hot product by re-splitting
+  its shards to the new quantity.
+
+So concurrent buyers of one product update different rows, and the
+products row is only written once per reconcile.
+
+All methods taking a ``cursor`` run inside the caller's transaction.
+A hot product's rows are always locked in the order hot_skus ->
+reservations -> inventory_shards -> products; products comes last
+because the foreign key checks of order_items and reservations inserts
+share-lock it.
+"""
+from datetime import datetime, timedelta
+import os
+import random
+import threading
+import time
+
+from db_pool import PoolTimeout
+from storage import Error
+
+INVENTORY_SHARDS = int(os.getenv("INVENTORY_SHARDS", "8"))
+MAX_SHARDS = 64
+INVENTORY_RESERVATION_TTL = float(os.getenv("INVENTORY_RESERVATION_TTL", "900"))
+INVENTORY_RECONCILE_INTERVAL = float(os.getenv("INVENTORY_RECONCILE_INTERVAL", "5"))
+RELEASE_BATCH_SIZE = 500
+
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _split(total, shards):
+    """``total`` units spread as evenly as possible over ``shards`` counters"""
+    return [total // shards + (1 if shard < total % shards else 0) for shard in range(shards)]
+
+
+class Inventory:
+    def __init__(self, database, on_change=None, reservation_ttl=INVENTORY_RESERVATION_TTL,
+                 reconcile_interval=INVENTORY_RECONCILE_INTERVAL):
+        self.database = database
+        # called with {product_id: quantity delta} when reconcile changes products.quantity
+        self.on_change = on_change
+        self.reservation_ttl = reservation_ttl
+        self.reconcile_interval = reconcile_interval
+        self._hot = {}  # product_id -> shard count, refreshed by every reconcile
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ---------- HOT SKU LOOKUP ----------
+    def is_hot(self, product_id):
+        """Whether the product was hot at the last reconcile (may lag a few seconds)"""
+        self.start()
+        return product_id in self._hot
+
+    def hot_skus_in(self, cursor, product_ids):
+        """{product_id: shards} for the hot products among ``product_ids``.
+
+        Share-locks the hot_skus rows (and the gaps for the others), so a
+        product can't be marked or unmarked hot under a running order.
+        """
+        cursor.execute(f"""
+            SELECT product_id, shards FROM hot_skus
+            WHERE product_id IN ({_placeholders(product_ids)})
+            LOCK IN SHARE MODE
+        """, list(product_ids))
+        return {row["product_id"]: row["shards"] for row in cursor.fetchall()}
+
+    # ---------- RESERVATIONS ----------
+    def _take(self, cursor, product_id, quantity, shards):
+        """Take ``quantity`` units off the shards; returns [(shard, units), ...] or None.
+
+        Tries one shard at a time starting from a random one, so
+        concurrent callers usually update (and lock) different rows; only
+        when no single shard has enough are all of them locked and drained.
+        """
+        if quantity <= 0:
+            # a negative "take" would credit the shards
+            raise ValueError(f"Can't take {quantity!r} units of product {product_id}")
+        start = random.randrange(shards)
+        for offset in range(shards):
+            shard = (start + offset) % shards
+            cursor.execute("""
+                UPDATE inventory_shards SET available = available - %s
+                WHERE product_id=%s AND shard=%s AND available >= %s
+            """, (quantity, product_id, shard, quantity))
+            if cursor.rowcount == 1:
+                return [(shard, quantity)]
+
+        cursor.execute("""
+            SELECT shard, available FROM inventory_shards
+            WHERE product_id=%s AND available > 0
+            ORDER BY shard
+            FOR UPDATE
+        """, (product_id,))
+        rows = cursor.fetchall()
+        if sum(row["available"] for row in rows) < quantity:
+            return None
+        taken = []
+        remaining = quantity
+        for row in rows:
+            units = min(row["available"], remaining)
+            taken.append((row["shard"], units))
+            remaining -= units
+            if not remaining:
+                break
+        self._credit(cursor, product_id, [(shard, -units) for shard, units in taken])
+        return taken
+
+    def _credit(self, cursor, product_id, changes):
+        """Add ``[(shard, units), ...]`` (negative to take) to a product's shards"""
+        for shard, units in sorted(changes):
+            cursor.execute(
+                "UPDATE inventory_shards SET available = available + %s WHERE product_id=%s AND shard=%s",
+                (units, product_id, shard)
+            )
+
+    def reserve(self, cursor, user_id, product_id, quantity):
+        """Reserve stock for a cart line.
+
+        Returns True when reserved, False when there isn't enough stock and
+        None when the product isn't hot (the caller checks
+        products.quantity as usual). ``quantity`` must be positive.
+        """
+        if type(quantity) is not int or quantity <= 0:
+            raise ValueError(f"Reserved quantity must be a positive integer, not {quantity!r}")
+        if not self.is_hot(product_id):
+            return None
+        expires_at = datetime.now() + timedelta(seconds=self.reservation_ttl)
+        cursor.execute(
+            "UPDATE reservations SET expires_at=%s WHERE user_id=%s AND product_id=%s",
+            (expires_at, user_id, product_id)
+        )
+        taken = self._take(cursor, product_id, quantity, self._hot[product_id])
+        if taken is None:
+            cursor.execute("SELECT shards FROM hot_skus WHERE product_id=%s", (product_id,))
+            if cursor.fetchone() is None:
+                # unmarked since the last reconcile
+                self._hot.pop(product_id, None)
+                return None
+            return False
+
+        rows = ", ".join(["(%s, %s, %s, %s, %s)"] * len(taken))
+        params = [value for shard, units in taken for value in (user_id, product_id, shard, units, expires_at)]
+        cursor.execute(
+            f"INSERT INTO reservations (user_id, product_id, shard, quantity, expires_at) VALUES {rows}", params
+        )
+        return True
+
+    def release(self, cursor, user_id, quantities):
+        """Shrink the user's reservations to ``{product_id: quantity left in the cart}``.
+
+        Called in the same transaction as removing or lowering cart lines
+        (0 for removed ones), so the units go back to the shards at once
+        instead of staying held until the reservations expire. Products
+        without reservations are ignored. Returns the units released.
+        """
+        product_ids = sorted(quantities)
+        if not product_ids:
+            return 0
+        cursor.execute(f"""
+            SELECT reservation_id, product_id, shard, quantity FROM reservations
+            WHERE user_id=%s AND product_id IN ({_placeholders(product_ids)})
+            ORDER BY reservation_id
+            FOR UPDATE
+        """, [user_id, *product_ids])
+        reservations = {}
+        for row in cursor.fetchall():
+            reservations.setdefault(row["product_id"], []).append(row)
+
+        returned = {}
+        deleted = []
+        shrunk = []
+        for product_id, rows in sorted(reservations.items()):
+            excess = sum(row["quantity"] for row in rows) - max(0, quantities[product_id])
+            for row in reversed(rows):  # newest first
+                if excess <= 0:
+                    break
+                units = min(row["quantity"], excess)
+                excess -= units
+                key = (product_id, row["shard"])
+                returned[key] = returned.get(key, 0) + units
+                if units == row["quantity"]:
+                    deleted.append(row["reservation_id"])
+                else:
+                    shrunk.append((row["quantity"] - units, row["reservation_id"]))
+        for (product_id, shard), units in sorted(returned.items()):
+            self._credit(cursor, product_id, [(shard, units)])
+        for quantity, reservation_id in shrunk:
+            cursor.execute("UPDATE reservations SET quantity=%s WHERE reservation_id=%s", (quantity, reservation_id))
+        if deleted:
+            cursor.execute(f"DELETE FROM reservations WHERE reservation_id IN ({_placeholders(deleted)})", deleted)
+        return sum(returned.values())
+
+    def consume(self, cursor, user_id, wanted, shards):
+        """Turn the user's reservations into sold stock for ``{product_id: quantity}`` hot lines.
+
+        ``shards`` is hot_skus_in()'s result for the same products.
+        Reservations short of the wanted quantity are topped up from the
+        shards and any surplus goes back. Returns the lines that can't be
+        fulfilled, shaped like create_order()'s failed items; the caller
+        rolls back when there are any.
+        """
+        product_ids = sorted(wanted)
+        cursor.execute(f"""
+            SELECT reservation_id, product_id, shard, quantity FROM reservations
+            WHERE user_id=%s AND product_id IN ({_placeholders(product_ids)})
+            ORDER BY reservation_id
+            FOR UPDATE
+        """, [user_id, *product_ids])
+        reservations = {}
+        for row in cursor.fetchall():
+            reservations.setdefault(row["product_id"], []).append(row)
+
+        failed = []
+        consumed = []
+        for product_id in product_ids:
+            rows = reservations.get(product_id, [])
+            reserved = sum(row["quantity"] for row in rows)
+            consumed.extend(row["reservation_id"] for row in rows)
+            if reserved > wanted[product_id]:
+                self._credit(cursor, product_id, [(rows[-1]["shard"], reserved - wanted[product_id])])
+            elif reserved < wanted[product_id]:
+                missing = wanted[product_id] - reserved
+                if self._take(cursor, product_id, missing, shards[product_id]) is None:
+                    cursor.execute("SELECT SUM(available) AS available FROM inventory_shards WHERE product_id=%s",
+                                   (product_id,))
+                    available = reserved + (cursor.fetchone()["available"] or 0)
+                    failed.append({"product_id": product_id, "requested": wanted[product_id], "available": available})
+        if consumed and not failed:
+            cursor.execute(f"DELETE FROM reservations WHERE reservation_id IN ({_placeholders(consumed)})", consumed)
+        return failed
+
+    def release_expired(self, cursor, limit=RELEASE_BATCH_SIZE):
+        """Return expired reservations to their shards; returns how many were released"""
+        cursor.execute(
+            "SELECT reservation_id FROM reservations WHERE expires_at < %s ORDER BY expires_at LIMIT %s",
+            (datetime.now(), limit)
+        )
+        ids = [row["reservation_id"] for row in cursor.fetchall()]
+        if not ids:
+            return 0
+        # locked by primary key only (no range), so new reservations aren't blocked;
+        # rows consumed by an order in the meantime are simply gone
+        cursor.execute(f"""
+            SELECT reservation_id, product_id, shard, quantity FROM reservations
+            WHERE reservation_id IN ({_placeholders(ids)})
+            FOR UPDATE
+        """, ids)
+        rows = cursor.fetchall()
+        returned = {}
+        for row in rows:
+            key = (row["product_id"], row["shard"])
+            returned[key] = returned.get(key, 0) + row["quantity"]
+        for (product_id, shard), units in sorted(returned.items()):
+            self._credit(cursor, product_id, [(shard, units)])
+        if rows:
+            released = [row["reservation_id"] for row in rows]
+            cursor.execute(f"DELETE FROM reservations WHERE reservation_id IN ({_placeholders(released)})", released)
+        return len(rows)
+
+    # ---------- ADMIN ----------
+    def mark_hot(self, cursor, product_id, shards=INVENTORY_SHARDS):
+        """Move a product's stock into ``shards`` counters (or re-split an already hot one).
+
+        Returns the units now available, or None if the product doesn't exist.
+        """
+        if not 1 <= shards <= MAX_SHARDS:
+            raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+        cursor.execute("SELECT product_id FROM products WHERE product_id=%s", (product_id,))
+        if cursor.fetchone() is None:
+            return None
+        # first, so orders already reading hot_skus finish before anything moves
+        cursor.execute(
+            "INSERT INTO hot_skus (product_id, shards) VALUES (%s, %s) ON DUPLICATE KEY UPDATE shards = VALUES(shards)",
+            (product_id, shards)
+        )
+        # open reservations return their units to a shard that still exists
+        cursor.execute("UPDATE reservations SET shard = 0 WHERE product_id=%s AND shard >= %s", (product_id, shards))
+        cursor.execute("SELECT shard, available FROM inventory_shards WHERE product_id=%s FOR UPDATE", (product_id,))
+        existing = cursor.fetchall()
+        cursor.execute("SELECT quantity FROM products WHERE product_id=%s FOR UPDATE", (product_id,))
+        product = cursor.fetchone()
+        if existing:
+            total = sum(row["available"] for row in existing)
+            cursor.execute("DELETE FROM inventory_shards WHERE product_id=%s", (product_id,))
+        else:
+            total = product["quantity"]
+
+        counts = _split(total, shards)
+        rows = ", ".join(["(%s, %s, %s)"] * shards)
+        params = [value for shard, count in enumerate(counts) for value in (product_id, shard, count)]
+        cursor.execute(f"INSERT INTO inventory_shards (product_id, shard, available) VALUES {rows}", params)
+        cursor.execute("UPDATE products SET quantity=%s WHERE product_id=%s", (total, product_id))
+        self._hot[product_id] = shards
+        return total
+
+    def unmark_hot(self, cursor, product_id):
+        """Fold shards and open reservations back into products.quantity.
+
+        Returns the product's quantity, or None if it wasn't hot.
+        """
+        cursor.execute("SELECT shards FROM hot_skus WHERE product_id=%s FOR UPDATE", (product_id,))
+        if cursor.fetchone() is None:
+            return None
+        cursor.execute("SELECT quantity FROM reservations WHERE product_id=%s FOR UPDATE", (product_id,))
+        reserved = sum(row["quantity"] for row in cursor.fetchall())
+        cursor.execute("SELECT available FROM inventory_shards WHERE product_id=%s FOR UPDATE", (product_id,))
+        total = reserved + sum(row["available"] for row in cursor.fetchall())
+
+        cursor.execute("DELETE FROM reservations WHERE product_id=%s", (product_id,))
+        cursor.execute("DELETE FROM inventory_shards WHERE product_id=%s", (product_id,))
+        cursor.execute("DELETE FROM hot_skus WHERE product_id=%s", (product_id,))
+        cursor.execute("UPDATE products SET quantity=%s WHERE product_id=%s", (total, product_id))
+        self._hot.pop(product_id, None)
+        return total
+
+    def restock_skus(self, cursor, quantities):
+        """Route new stock levels ``{sku: quantity}`` of hot SKUs into their shards.
+
+        Every reconcile copies a hot product's shard total over
+        products.quantity, so a restock written only to products would be
+        undone. The shards are re-split to the new quantity less the units
+        held in open reservations instead. Returns {sku: units now
+        available} for the hot SKUs; the caller writes those to
+        products.quantity in the same transaction.
+        """
+        skus = sorted(quantities)
+        if not skus:
+            return {}
+        cursor.execute(f"SELECT product_id, sku FROM products WHERE sku IN ({_placeholders(skus)})", skus)
+        skus_by_id = {row["product_id"]: row["sku"] for row in cursor.fetchall()}
+        hot = self.hot_skus_in(cursor, sorted(skus_by_id)) if skus_by_id else {}
+        available = {}
+        for product_id in sorted(hot):
+            sku = skus_by_id[product_id]
+            cursor.execute("SELECT quantity FROM reservations WHERE product_id=%s FOR UPDATE", (product_id,))
+            reserved = sum(row["quantity"] for row in cursor.fetchall())
+            cursor.execute("""
+                SELECT shard, available FROM inventory_shards
+                WHERE product_id=%s
+                ORDER BY shard
+                FOR UPDATE
+            """, (product_id,))
+            shards = cursor.fetchall()
+            if not shards:
+                continue
+            available[sku] = max(0, quantities[sku] - reserved)
+            changes = [(row["shard"], target - row["available"])
+                       for row, target in zip(shards, _split(available[sku], len(shards)))
+                       if target != row["available"]]
+            self._credit(cursor, product_id, changes)
+        return available
+
+    def status(self, cursor):
+        """Every hot product with its shard count, unreserved and reserved units"""
+        cursor.execute("""
+            SELECT h.product_id, h.shards,
+                   (SELECT COALESCE(SUM(available), 0) FROM inventory_shards s WHERE s.product_id = h.product_id)
+                       AS available,
+                   (SELECT COALESCE(SUM(quantity), 0) FROM reservations r WHERE r.product_id = h.product_id)
+                       AS reserved
+            FROM hot_skus h
+            ORDER BY h.product_id
+        """)
+        return [{**row, "available": int(row["available"]), "reserved": int(row["reserved"])}
+                for row in cursor.fetchall()]
+
+    # ---------- RECONCILIATION ----------
+    def reconcile(self):
+        """Release expired reservations, rebalance shards and sync products.quantity.
+
+        Each product is handled in its own short transaction. Returns
+        {product_id: quantity delta} for the products rows it changed.
+        """
+        db = self.database.connect()
+        cursor = db.cursor()
+        try:
+            self.release_expired(cursor)
+            db.commit()
+
+            cursor.execute("SELECT product_id, shards FROM hot_skus")
+            self._hot = {row["product_id"]: row["shards"] for row in cursor.fetchall()}
+            db.commit()
+
+            deltas = {}
+            for product_id in sorted(self._hot):
+                cursor.execute("""
+                    SELECT shard, available FROM inventory_shards
+                    WHERE product_id=%s
+                    ORDER BY shard
+                    FOR UPDATE
+                """, (product_id,))
+                shards = cursor.fetchall()
+                cursor.execute("SELECT quantity FROM products WHERE product_id=%s FOR UPDATE", (product_id,))
+                product = cursor.fetchone()
+                if product is None or not shards:
+                    db.rollback()
+                    continue
+                total = sum(row["available"] for row in shards)
+                balanced = _split(total, len(shards))
+                changes = [(row["shard"], target - row["available"])
+                           for row, target in zip(shards, balanced) if target != row["available"]]
+                self._credit(cursor, product_id, changes)
+                if product["quantity"] != total:
+                    cursor.execute("UPDATE products SET quantity=%s WHERE product_id=%s", (total, product_id))
+                    deltas[product_id] = total - product["quantity"]
+                db.commit()
+            return deltas
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+            db.close()
+
+    def _run(self):
+        while True:
+            try:
+                deltas = self.reconcile()
+                if deltas and self.on_change:
+                    self.on_change(deltas)
+            except (Error, PoolTimeout) as e:
+                print(f"Inventory reconcile failed: {e}")
+            except Exception as e:
+                print(f"Inventory reconcile error: {e}")
+            time.sleep(self.reconcile_interval)
+
+    def start(self):
+        """Start the reconcile thread (again after a fork); cheap when already running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="inventory-reconcile", daemon=True)
+                self._thread.start()
@@ -0,0 +1,94 @@
+"""
+JSON provider for the Flask app (``app.json``), also used by the
+streaming and cached-listing paths and async_server.py.
+
+Rows from the database carry DECIMAL, DATE and DATETIME values that
+Flask's default provider sends through its slow ``default=`` hook, as
+strings for Decimal and RFC 822 dates for date/datetime. Here they
+follow fixed policies instead:
+
+- Decimal: JSON numbers by default, or exact strings ("12999.00") with
+  JSON_DECIMAL_MODE=string.
+- date / datetime: ISO 8601 ("2024-05-01", "2024-05-01T10:30:00").
+
+orjson serializes dates natively and much faster than the json module
+when it is installed; the stdlib is used otherwise, with the same output
+apart from whitespace.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
+import os
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json with the same policies
+    orjson = None
+
+JSON_DECIMAL_MODE = os.getenv("JSON_DECIMAL_MODE", "number")
+DECIMAL_MODES = ("number", "string")
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson when available.
+
+    ``dumps_bytes()`` skips the str round trip for callers that build
+    response bodies themselves.
+    """
+
+    mimetype = "application/json"
+    sort_keys = True
+    compact = None
+
+    def __init__(self, app, decimal_mode=JSON_DECIMAL_MODE):
+        super().__init__(app)
+        if decimal_mode not in DECIMAL_MODES:
+            raise ValueError(f"JSON_DECIMAL_MODE must be one of: {', '.join(DECIMAL_MODES)}")
+        self.decimal_mode = decimal_mode
+        self._decimal = float if decimal_mode == "number" else str
+
+    def _default(self, value):
+        if isinstance(value, Decimal):
+            return self._decimal(value)
+        if isinstance(value, (date, datetime, time)):
+            # only reached by the stdlib path; orjson handles these itself
+            return value.isoformat()
+        if hasattr(value, "__html__"):
+            return str(value.__html__())
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def _pretty(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def _orjson(self, obj, pretty=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self._default, option=option)
+
+    def dumps_bytes(self, obj, pretty=False):
+        if orjson is not None:
+            return self._orjson(obj, pretty)
+        return self.dumps(obj, indent=2 if pretty else None).encode()
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._orjson(obj).decode()
+        kwargs.setdefault("default", self._default)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        if kwargs.get("indent") is None:
+            kwargs.setdefault("separators", (",", ":"))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj, self._pretty()) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,50 @@
+"""
+Bulk-load products from a CSV or JSONL supplier feed into mobile_shop.
+
+Usage: python load_products.py feed.csv [--format csv|jsonl] [--chunk-size 1000]
+
+Rows are upserted on their sku, one commit per chunk. CSV files need a
+header row with the columns sku, name, price, quantity and optionally
+description and image.
+"""
+import argparse
+
+from inventory import Inventory
+from product_ingest import DEFAULT_CHUNK_SIZE, ingest_products, iter_csv, iter_jsonl
+from storage import Error, create_backend
+
+
+def load_products(path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    if file_format is None:
+        file_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+    conn = None
+    try:
+        print("Connecting to database...")
+        # Same DB_BACKEND / DB_* settings as Backend.py
+        database = create_backend()
+        conn = database.connect()
+
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = iter_csv(f) if file_format == "csv" else iter_jsonl(f)
+            # hot SKUs' quantities go to their stock shards (see inventory.py)
+            report = ingest_products(conn, rows, chunk_size, Inventory(database))
+
+        print(f"Loaded {report['accepted']} products in {report['chunks']} chunks, {report['failed']} rows rejected")
+        for error in report["errors"]:
+            print(f"  row {error['row']}: {error['error']}")
+        return report
+    except Error as e:
+        print(f"Error: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load products from CSV or JSONL")
+    parser.add_argument("path", help="CSV or JSONL file to load")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per INSERT/commit")
+    args = parser.parse_args()
+    load_products(args.path, args.format, args.chunk_size)
@@ -0,0 +1,252 @@
+"""
+In-process metrics exposed in Prometheus text format at /metrics.
+
+Counters and histograms are recorded into a per-thread shard, so the hot
+path (one request, one query) takes no lock; /metrics sums the shards
+when it is scraped. Shards of finished threads are folded into one, so
+thread-per-request servers don't grow the list without bound. Gauges
+are callbacks read at scrape time (pool usage, hashing queue depth, ...).
+
+Under gunicorn every worker has its own registry. Set METRICS_DIR to a
+directory shared by the workers and each one also writes its counters
+there every METRICS_FLUSH_INTERVAL seconds; /metrics then reports the
+sum over all workers, whichever worker answers the scrape.
+"""
+from bisect import bisect_left
+from functools import lru_cache
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# thread shards kept before the first sweep for finished threads
+MIN_PRUNE_SHARDS = 64
+
+
+def _add_shard(totals, shard):
+    """Add one shard's counters and histogram buckets into ``totals``"""
+    for key, value in dict(shard).items():
+        if isinstance(value, list):
+            current = totals.get(key)
+            totals[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._meta = {}       # name -> (type, help, buckets)
+        self._callbacks = []  # (name, fn) for gauge-style metrics
+        self._local = threading.local()
+        self._shards = []     # (thread, shard) for every thread that recorded something
+        self._retired = {}    # totals folded in from the shards of finished threads
+        self._prune_at = MIN_PRUNE_SHARDS
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    # ---------- DEFINITIONS ----------
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(buckets))
+
+    def callback(self, name, metric_type, help_text, fn):
+        """Register ``fn() -> [(labels dict, value), ...]`` read at scrape time"""
+        self._meta[name] = (metric_type, help_text, None)
+        self._callbacks.append((name, fn))
+
+    # ---------- RECORDING ----------
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._prune_at:
+                    self._prune()
+        return shard
+
+    def _prune(self):
+        """Fold the shards of finished threads into ``_retired`` (lock held).
+
+        Servers that start a thread per request would otherwise keep one
+        shard per request forever. Runs whenever the shard count doubles,
+        so the cost per new thread stays constant.
+        """
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _add_shard(self._retired, shard)
+        self._shards = live
+        self._prune_at = max(MIN_PRUNE_SHARDS, 2 * len(live))
+
+    def inc(self, name, labels=(), amount=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        """Add ``value`` to histogram ``name``; labels is a tuple of (name, value) pairs"""
+        shard = self._shard()
+        key = (name, labels)
+        buckets = self._meta[name][2]
+        entry = shard.get(key)
+        if entry is None:
+            # per-bucket counts (last one is +Inf), then sum
+            entry = shard[key] = [0] * (len(buckets) + 1) + [0.0]
+        entry[bisect_left(buckets, value)] += 1
+        entry[-1] += value
+
+    def reset(self):
+        """Drop everything recorded so far (e.g. counts inherited across fork)"""
+        with self._lock:
+            self._shards = []
+            self._retired = {}
+            self._prune_at = MIN_PRUNE_SHARDS
+            self._local = threading.local()
+            self._flusher = None
+
+    # ---------- EXPORT ----------
+    def snapshot(self):
+        """Sum of all thread shards as {(name, labels): value or bucket list}"""
+        with self._lock:
+            self._prune()
+            shards = [shard for _, shard in self._shards]
+            totals = {}
+            _add_shard(totals, self._retired)
+        for shard in shards:
+            _add_shard(totals, shard)
+        return totals
+
+    def _merge_worker_files(self, totals):
+        own = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+        for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                current = totals.get(key)
+                if current is None:
+                    totals[key] = value
+                elif isinstance(value, list):
+                    totals[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    totals[key] = current + value
+        return totals
+
+    def write_worker_file(self):
+        path = os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.json")
+        entries = [[name, labels, value] for (name, labels), value in self.snapshot().items()]
+        with open(path + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(path + ".tmp", path)
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.write_worker_file()
+            except OSError as e:
+                print(f"Could not write metrics file: {e}")
+
+    def start_flusher(self):
+        """Start sharing this worker's counters through METRICS_DIR (no-op when unset)"""
+        if not METRICS_DIR or self._flusher is not None:
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self._flusher = threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        totals = self.snapshot()
+        if METRICS_DIR:
+            self.start_flusher()
+            totals = self._merge_worker_files(totals)
+
+        series = {}
+        for (name, labels), value in totals.items():
+            series.setdefault(name, []).append((labels, value))
+        for name, fn in self._callbacks:
+            try:
+                series[name] = [(tuple(labels.items()), value) for labels, value in fn()]
+            except Exception as e:
+                print(f"Metrics callback {name} failed: {e}")
+
+        lines = []
+        for name in sorted(series):
+            metric_type, help_text, buckets = self._meta.get(name, ("untyped", "", None))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in sorted(series[name], key=lambda item: item[0]):
+                if metric_type != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------- QUERY LABELS ----------
+VERB_PATTERN = re.compile(r"^\s*(\w+)")
+TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Low-cardinality label for a statement: verb plus first table, e.g. 'SELECT products'"""
+    verb = VERB_PATTERN.match(sql)
+    if not verb:
+        return "OTHER"
+    table = TABLE_PATTERN.search(sql)
+    return f"{verb.group(1).upper()} {table.group(1)}" if table else verb.group(1).upper()
+
+
+def record_query(sql, seconds, failed=False):
+    labels = (("statement", statement_label(sql)),)
+    registry.observe("db_query_duration_seconds", seconds, labels)
+    if failed:
+        registry.inc("db_query_errors_total", labels)
+
+
+registry = MetricsRegistry()
+
+registry.counter("http_requests_total", "HTTP requests by route, method and status")
+registry.histogram("http_request_duration_seconds", "Time spent in the request handler")
+registry.histogram("db_query_duration_seconds", "Database statement time by statement type and table")
+registry.counter("db_query_errors_total", "Database statements that raised an error")
+registry.histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+registry.histogram("password_hash_duration_seconds", "Password hash/verify time, including queueing")
@@ -0,0 +1,161 @@
+"""
+Password hashing off the request thread.
+
+generate_password_hash/check_password_hash are deliberately slow and hold
+the GIL, so the auth routes send them to a small process pool instead.
+At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE jobs are in flight;
+callers wait up to PASSWORD_HASH_TIMEOUT seconds for a slot and for the
+result, and get HashingUnavailable otherwise. PASSWORD_HASH_WORKERS=0
+hashes inline on the calling thread. If a hashing process dies (e.g.
+OOM-killed) the pool is rebuilt and the job retried once.
+
+PASSWORD_HASH_METHOD / PASSWORD_SALT_LENGTH set the cost of new hashes;
+verify_password() reports a fresh hash whenever a stored one was made
+with different parameters, so logins upgrade old hashes transparently.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import multiprocessing
+import os
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import registry
+
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE", str(max(HASH_WORKERS, 1) * 8)))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))
+# forkserver where the platform has it (Linux, macOS), spawn elsewhere
+HASH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class HashingUnavailable(Exception):
+    """The hashing queue stayed full, or a hash didn't finish, within HASH_TIMEOUT"""
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+@lru_cache(maxsize=None)
+def _hash_format(method, salt_length):
+    """(method field, salt length) of hashes made with these settings.
+
+    Taken from a real hash because werkzeug fills in defaults, e.g.
+    "scrypt" is stored as "scrypt:32768:8:1" and "pbkdf2" as
+    "pbkdf2:sha256:600000"; computed once per process.
+    """
+    stored_method, salt, _ = generate_password_hash("", method=method, salt_length=salt_length).split("$", 2)
+    return stored_method, len(salt)
+
+
+def _verify(pwhash, password, method, salt_length):
+    if not check_password_hash(pwhash, password):
+        return False, None
+    stored_method, salt, _ = pwhash.split("$", 2)
+    if (stored_method, len(salt)) == _hash_format(method, salt_length):
+        return True, None
+    return True, generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+class HashExecutor:
+    """Bounded front for a lazily created ProcessPoolExecutor"""
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.capacity = workers + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # not fork: the web workers are multi-threaded, and a child forked
+                # while another thread holds a lock can deadlock on it
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(HASH_START_METHOD)
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool (e.g. a child was OOM-killed) so the next call builds a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        try:
+            return self._submit(fn, *args)
+        except BrokenProcessPool:
+            pass  # a child died (e.g. OOM-killed); _submit dropped the pool
+        try:
+            return self._submit(fn, *args)
+        except BrokenProcessPool:
+            raise HashingUnavailable("Password hashing pool is broken")
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingUnavailable("Password hashing queue is full")
+        with self._lock:
+            self.pending += 1
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except Exception as e:
+            self._release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+            raise
+        # the slot is held until the worker is really done, even if we give up waiting
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingUnavailable("Password hashing timed out")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+
+    def shutdown(self):
+        """Drop the pool (e.g. after fork); it is recreated on next use"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hash_executor = HashExecutor(HASH_WORKERS, HASH_QUEUE_SIZE, HASH_TIMEOUT)
+
+
+def _timed(operation, fn, *args):
+    started = time.perf_counter()
+    try:
+        return hash_executor.run(fn, *args)
+    finally:
+        registry.observe("password_hash_duration_seconds", time.perf_counter() - started,
+                         (("operation", operation),))
+
+
+def hash_password(password):
+    return _timed("hash", _hash, password, HASH_METHOD, SALT_LENGTH)
+
+
+def verify_password(pwhash, password):
+    """Return (matches, new_hash); new_hash is set when the stored hash should be upgraded"""
+    return _timed("verify", _verify, pwhash, password, HASH_METHOD, SALT_LENGTH)
@@ -0,0 +1,134 @@
+"""
+Bulk product ingest shared by the /products/bulk endpoint and load_products.py.
+
+Rows are validated one by one, then upserted on the unique ``sku`` column
+with one multi-row INSERT ... ON DUPLICATE KEY UPDATE and one commit per
+chunk. Invalid rows are reported and skipped; they never abort a chunk.
+"""
+from decimal import Decimal, InvalidOperation
+import csv
+import json
+
+from storage import Error
+
+PRODUCT_COLUMNS = ("sku", "name", "price", "quantity", "description", "image")
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+UPSERT_PREFIX = f"INSERT INTO products ({', '.join(PRODUCT_COLUMNS)}) VALUES "
+UPSERT_SUFFIX = " ON DUPLICATE KEY UPDATE " + ", ".join(
+    f"{column}=VALUES({column})" for column in PRODUCT_COLUMNS if column != "sku"
+)
+
+
+def validate_product(row):
+    """Return (values, None) for a valid row or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+
+    sku = str(row.get("sku") or "").strip()
+    if not sku or len(sku) > 64:
+        return None, "sku is required (max 64 characters)"
+    name = str(row.get("name") or "").strip()
+    if not name or len(name) > 100:
+        return None, "name is required (max 100 characters)"
+
+    try:
+        price = Decimal(str(row.get("price")))
+        if not price.is_finite():
+            return None, "price must be a number"
+        price = price.quantize(Decimal("0.01"))
+        if price < 0 or price >= Decimal("100000000"):
+            return None, "price out of range"
+    except (InvalidOperation, ValueError):
+        return None, "price must be a number"
+
+    try:
+        quantity = int(str(row.get("quantity")).strip())
+    except ValueError:
+        return None, "quantity must be an integer"
+    if quantity < 0:
+        return None, "quantity must not be negative"
+
+    description = row.get("description") or ""
+    image = str(row.get("image") or "")
+    if len(image) > 255:
+        return None, "image path too long (max 255 characters)"
+
+    return (sku, name, price, quantity, str(description), image), None
+
+
+def iter_jsonl(lines):
+    """Yield parsed objects from JSON lines, or {"__error__": ...} for bad lines"""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield {"__error__": f"Invalid JSON: {e}"}
+
+
+def iter_csv(fileobj):
+    yield from csv.DictReader(fileobj)
+
+
+def ingest_products(db, rows, chunk_size=DEFAULT_CHUNK_SIZE, inventory=None):
+    """Upsert an iterable of product dicts through ``db`` in chunks.
+
+    With an ``inventory`` (inventory.Inventory), the quantities of hot
+    SKUs go into their stock shards, as products.quantity alone would be
+    overwritten by the next reconcile.
+
+    Returns a report: number of rows accepted, number failed and the
+    per-row errors (1-based row numbers, capped at MAX_REPORTED_ERRORS).
+    """
+    report = {"accepted": 0, "failed": 0, "chunks": 0, "errors": []}
+
+    def fail(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    def flush(chunk):
+        cursor = db.cursor()
+        try:
+            if inventory is not None:
+                available = inventory.restock_skus(cursor, {values[0]: values[3] for _, values in chunk})
+                chunk = [(row_number, values[:3] + (available[values[0]],) + values[4:])
+                         if values[0] in available else (row_number, values)
+                         for row_number, values in chunk]
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+            params = [value for _, values in chunk for value in values]
+            cursor.execute(UPSERT_PREFIX + placeholders + UPSERT_SUFFIX, params)
+            db.commit()
+            report["accepted"] += len(chunk)
+        except Error as e:
+            db.rollback()
+            print(f"Bulk ingest chunk failed: {e}")
+            for row_number, _ in chunk:
+                fail(row_number, "Database error")
+        finally:
+            cursor.close()
+        report["chunks"] += 1
+
+    chunk = []
+    for row_number, row in enumerate(rows, start=1):
+        if isinstance(row, dict) and "__error__" in row:
+            fail(row_number, row["__error__"])
+            continue
+        values, error = validate_product(row)
+        if error:
+            fail(row_number, error)
+            continue
+        chunk.append((row_number, values))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    return report
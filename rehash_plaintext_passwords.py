@@ -0,0 +1,37 @@
+"""
+One-off migration: hash any passwords still stored in plain text.
+
+login() no longer accepts plain-text passwords, so run this once against
+databases created before passwords were hashed.
+"""
+import mysql.connector
+from werkzeug.security import generate_password_hash
+import os
+
+db_config = {
+    "host": "localhost",
+    "user": "root",
+    "password": os.getenv('DB_PASSWORD', 'A@ihb064'),
+    "database": "mobile_shop"
+}
+
+try:
+    print("Connecting to database...")
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+
+    # Werkzeug hashes always look like "method$salt$hash"
+    cursor.execute("SELECT user_id, password FROM users WHERE password NOT LIKE '%$%$%'")
+    rows = cursor.fetchall()
+    print(f"Found {len(rows)} plain-text passwords")
+
+    cursor.executemany(
+        "UPDATE users SET password=%s WHERE user_id=%s",
+        [(generate_password_hash(password), user_id) for user_id, password in rows]
+    )
+    conn.commit()
+    print("Successfully hashed plain-text passwords.")
+
+    conn.close()
+except Exception as e:
+    print(f"Error: {e}")
@@ -51,6 +51,7 @@ function signup() {
         localStorage.setItem('userId', data.user.user_id || data.user.id);
         localStorage.setItem('username', data.user.username);
         localStorage.setItem('userType', 'customer');
+        localStorage.setItem('authToken', data.token);
       }
       alert("Sign-up successful! Redirecting to login page...");
       window.location.href = 'loginpage.html';
@@ -88,6 +89,7 @@ function handleGoogleLogin(response) {
       localStorage.setItem('userId', data.user.user_id || data.user.id);
       localStorage.setItem('username', data.user.username || data.user.name);
       localStorage.setItem('userType', 'customer');
+      localStorage.setItem('authToken', data.token);
       
       alert('Google Sign-In successful!');
       window.location.href = 'index.html';
@@ -0,0 +1,153 @@
+"""
+Slow-query log for the storage cursor layer.
+
+Statements slower than SLOW_QUERY_MS are written as JSON lines to
+SLOW_QUERY_LOG (rotated at SLOW_QUERY_LOG_BYTES, SLOW_QUERY_LOG_BACKUPS
+files kept) with their normalized fingerprint, duration, row count and
+the route that ran them. Parameters are never logged.
+
+Size-based rotation is only safe with one writing process. A "{pid}" in
+SLOW_QUERY_LOG gives each process its own file (gunicorn.conf.py does
+this by default); SLOW_QUERY_LOG_BYTES=0 turns rotation off and reopens
+the file whenever it is moved, for a shared file rotated by logrotate.
+
+A SLOW_QUERY_EXPLAIN_RATE fraction of slow SELECTs is also EXPLAINed on
+a separate pooled connection by a background thread, and the plan is
+added to the entry, so missing indexes show up from production traffic:
+
+    jq -r 'select(.plan) | [.fingerprint, (.plan | tostring)] | @tsv' slow_queries*.log
+
+SLOW_QUERY_MS=-1 turns the log off.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.getenv(
+    "SLOW_QUERY_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_queries.log")
+)
+SLOW_QUERY_LOG_BYTES = int(os.getenv("SLOW_QUERY_LOG_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+MAX_LOGGED_SQL = 2000
+
+# Set per request by Backend.py / async_server.py
+current_route = ContextVar("current_route", default=None)
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER = re.compile(r"%s|\?")
+VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+REPEATED_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+REPEATED_WHEN = re.compile(r"(?:WHEN \? THEN \?\s*)+", re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+FOR_UPDATE = re.compile(r"\s+FOR UPDATE\s*$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """Normalize a statement so every variant of one query groups together.
+
+    Literals and placeholders become ``?``, IN lists and multi-row VALUES
+    collapse to ``(...)``, and CASE ladders to a single ``WHEN ? THEN ?``.
+    """
+    sql = STRING_LITERAL.sub("?", sql)
+    sql = PLACEHOLDER.sub("?", sql)
+    sql = NUMBER_LITERAL.sub("?", sql)
+    sql = WHITESPACE.sub(" ", sql).strip()
+    sql = VALUE_LIST.sub("(...)", sql)
+    sql = REPEATED_ROWS.sub("(...)", sql)
+    return REPEATED_WHEN.sub("WHEN ? THEN ? ", sql)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, path=SLOW_QUERY_LOG, explain_rate=SLOW_QUERY_EXPLAIN_RATE,
+                 max_bytes=SLOW_QUERY_LOG_BYTES, backups=SLOW_QUERY_LOG_BACKUPS):
+        # cursors compare against this on every statement, so keep it a plain float
+        self.threshold = threshold_ms / 1000 if threshold_ms >= 0 else float("inf")
+        self.path = path
+        self.explain_rate = explain_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._logger = None
+        self._logger_pid = None
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _get_logger(self):
+        with self._lock:
+            pid = os.getpid()
+            if self._logger_pid != pid:  # first use, or first use after a fork
+                logger = logging.getLogger(f"slow_queries.{id(self)}")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                path = self.path.replace("{pid}", str(pid))
+                if self.max_bytes > 0:
+                    handler = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups)
+                else:
+                    handler = WatchedFileHandler(path)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                self._logger = logger
+                self._logger_pid = pid
+            return self._logger
+
+    def _write(self, entry):
+        self._get_logger().info(json.dumps(entry, default=str))
+
+    def record(self, sql, params, seconds, rows, explain=None, failed=False):
+        """Log one slow statement; ``explain(sql, params)`` returns its plan rows"""
+        if sql.lstrip()[:7].upper() == "EXPLAIN":
+            return  # our own plan lookups
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "fingerprint": fingerprint(sql),
+            "sql": WHITESPACE.sub(" ", sql).strip()[:MAX_LOGGED_SQL],
+            "duration_ms": round(seconds * 1000, 2),
+            "rows": rows,
+            "route": current_route.get(),
+            "pid": os.getpid(),
+        }
+        if failed:
+            entry["failed"] = True
+        sampled = explain is not None and not failed and entry["fingerprint"].upper().startswith("SELECT") \
+            and random.random() < self.explain_rate
+        if not sampled:
+            self._write(entry)
+            return
+        try:
+            self._explain_queue.put_nowait((entry, sql, params, explain))
+            self._start_worker()
+        except queue.Full:
+            self._write(entry)
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._explain_forever, name="slow-query-explain", daemon=True)
+                self._worker.start()
+
+    def _explain_forever(self):
+        while True:
+            entry, sql, params, explain = self._explain_queue.get()
+            try:
+                entry["plan"] = explain(FOR_UPDATE.sub("", sql), params)
+            except Exception as e:
+                entry["plan_error"] = str(e)
+            self._write(entry)
+
+
+slow_queries = SlowQueryLog()
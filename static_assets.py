@@ -0,0 +1,101 @@
+"""
+Serve the HTML pages, script.js and src/ images from Backend.py.
+
+With a build from build_assets.py in STATIC_BUILD_DIR (default dist/):
+
+- fingerprinted /assets/... URLs are sent with
+  ``Cache-Control: public, max-age=31536000, immutable``;
+- pages and original src/ paths get ``no-cache``, so browsers revalidate
+  them with their strong ETag and normally get a 304;
+- the precompressed .br/.gz variant the client accepts is sent as is,
+  never compressed per request.
+
+Without a build the source files are served directly (no fingerprints or
+compression), which is enough for development. Their ETags follow edits:
+each request re-stats the file and rehashes it when its mtime or size
+changed.
+"""
+from functools import lru_cache
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import send_file
+
+from build_assets import MANIFEST_NAME, SOURCE_DIR, source_assets, source_pages
+
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(SOURCE_DIR, "dist"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# best first
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+@lru_cache(maxsize=1024)
+def _file_etag(path, mtime_ns, size):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class StaticAssets:
+    def __init__(self, build_dir=STATIC_BUILD_DIR, source_dir=SOURCE_DIR):
+        manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                self.files = json.load(f)["files"]
+            self.root = build_dir
+            self.built = True
+        else:
+            self.files = self._scan_sources(source_dir)
+            self.root = source_dir
+            self.built = False
+
+    @staticmethod
+    def _scan_sources(source_dir):
+        files = {}
+        for rel_path in source_pages(source_dir) + source_assets(source_dir):
+            files[rel_path] = {
+                "file": rel_path,
+                "etag": None,  # from the file as it is at request time
+                "content_type": mimetypes.guess_type(rel_path)[0] or "application/octet-stream",
+                "encodings": {},
+                "immutable": False,
+            }
+        return files
+
+    def response(self, path, request):
+        """Response for ``path`` (already URL-decoded), or None if it isn't an asset.
+
+        Only files listed in the manifest are served, so no path can
+        escape the asset root.
+        """
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+
+        file_path, etag, encoding = entry["file"], entry["etag"], None
+        if etag is None:
+            source = os.path.join(self.root, file_path)
+            try:
+                stat = os.stat(source)
+            except FileNotFoundError:
+                return None  # deleted since startup
+            etag = _file_etag(source, stat.st_mtime_ns, stat.st_size)
+        for candidate in ENCODING_PREFERENCE:
+            if candidate in entry["encodings"] and candidate in request.accept_encodings:
+                file_path, etag, encoding = entry["encodings"][candidate], f"{etag}-{candidate}", candidate
+                break
+
+        response = send_file(
+            os.path.join(self.root, file_path), mimetype=entry["content_type"],
+            etag=False, conditional=False, max_age=None
+        )
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = IMMUTABLE if entry["immutable"] else REVALIDATE
+        if entry["encodings"]:
+            response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response.make_conditional(request)
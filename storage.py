@@ -0,0 +1,387 @@
+"""
+Pluggable storage backends.
+
+Every route talks to the database through a backend from create_backend():
+
+- MySQLBackend: the production setup (primary + replica pools, see
+  db_pool.py and db_router.py).
+- SQLiteBackend: a file or in-memory database loaded from
+  Database/sqlite_schema.sql, so the whole app runs on a box with no
+  database server. Handy for tests and load tests.
+
+Both hand out StorageConnection/StorageCursor wrappers with one contract:
+dictionary rows, MySQL-style ``%s`` placeholders and SQL, and driver
+exceptions re-raised as storage.Error / storage.IntegrityError with MySQL
+error numbers.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+import itertools
+import os
+import re
+import sqlite3
+import time
+
+from db_pool import ConnectionPool
+from db_router import DatabaseRouter
+from metrics import record_query
+from slow_query_log import slow_queries
+
+ER_DUP_ENTRY = 1062
+
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Database", "sqlite_schema.sql")
+
+
+class Error(Exception):
+    """Any database error, whatever the backend"""
+
+    def __init__(self, msg, errno=None):
+        super().__init__(msg)
+        self.msg = msg
+        self.errno = errno
+
+
+class IntegrityError(Error):
+    """Constraint violation; errno is ER_DUP_ENTRY for duplicate unique keys"""
+
+
+class StorageCursor:
+    def __init__(self, backend, raw, conn):
+        self._backend = backend
+        self._raw = raw
+        self._conn = conn
+        # a slow statement waiting for its rows to be counted (see _log_slow)
+        self._slow = None
+        self._fetched = 0
+
+    def _timed(self, sql, params, fn):
+        self._log_slow()
+        started = time.perf_counter()
+        failed = True
+        try:
+            with self._backend.errors():
+                fn()
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            record_query(sql, elapsed, failed)
+            if elapsed >= slow_queries.threshold:
+                self._slow = (sql, params, elapsed, failed)
+                self._fetched = 0
+
+    def _log_slow(self):
+        """Write the pending slow statement once its result has been read"""
+        if self._slow is None:
+            return
+        sql, params, elapsed, failed = self._slow
+        self._slow = None
+        rowcount = self._raw.rowcount
+        rows = rowcount if rowcount is not None and rowcount >= 0 else self._fetched
+        slow_queries.record(sql, params, elapsed, rows, self._backend.explain, failed)
+
+    def execute(self, sql, params=()):
+        translated, write_lock = self._backend.translate(sql)
+
+        def run():
+            if write_lock:
+                self._backend.lock_for_update(self._raw, self._conn)
+            self._raw.execute(translated, tuple(params))
+        self._timed(sql, params, run)
+
+    def executemany(self, sql, seq_of_params):
+        translated, _ = self._backend.translate(sql)
+        rows = [tuple(p) for p in seq_of_params]
+        self._timed(sql, (), lambda: self._raw.executemany(translated, rows))
+
+    def fetchone(self):
+        with self._backend.errors():
+            row = self._raw.fetchone()
+        if row is not None:
+            self._fetched += 1
+        return row
+
+    def fetchall(self):
+        with self._backend.errors():
+            rows = self._raw.fetchall()
+        self._fetched += len(rows)
+        return rows
+
+    def fetchmany(self, size):
+        with self._backend.errors():
+            rows = self._raw.fetchmany(size)
+        self._fetched += len(rows)
+        return rows
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    def close(self):
+        self._log_slow()
+        try:
+            self._raw.close()
+        except Exception:
+            pass
+
+
+class StorageConnection:
+    """A checked-out pooled connection; close() returns it to its pool"""
+
+    def __init__(self, backend, pooled):
+        self._backend = backend
+        self._pooled = pooled
+
+    def cursor(self):
+        return StorageCursor(self._backend, self._backend.raw_cursor(self._pooled), self._pooled)
+
+    def commit(self):
+        with self._backend.errors():
+            self._pooled.commit()
+
+    def rollback(self):
+        with self._backend.errors():
+            self._pooled.rollback()
+
+    def close(self):
+        self._pooled.close()
+
+
+def explain_plan(backend, prefix, sql, params):
+    """Run ``prefix + sql`` (an EXPLAIN) on its own read-only connection"""
+    conn = backend.connect(read_only=True)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@contextmanager
+def translated_errors(backend):
+    """Re-raise the backend driver's exceptions as storage.Error subclasses"""
+    try:
+        yield
+    except backend.driver_error as e:
+        raise backend.convert_error(e) from e
+
+
+# ---------- MYSQL ----------
+class MySQLBackend:
+    name = "mysql"
+
+    def __init__(self, config, replica_hosts=(), sticky_seconds=5.0, **pool_options):
+        import mysql.connector
+        self._mysql = mysql.connector
+        self.driver_error = mysql.connector.Error
+        self.config = config
+        self.pool_options = pool_options
+        self.primary = self._make_pool(config)
+        self.router = DatabaseRouter(
+            self.primary,
+            [self._make_pool({**config, **self._replica_config(a)}, f"replica:{a.strip()}") for a in replica_hosts],
+            sticky_seconds=sticky_seconds
+        )
+
+    def _make_pool(self, config, name="primary"):
+        # Connections are opened on demand, so a database that is down at
+        # startup only fails the requests made while it is down
+        return ConnectionPool(lambda: self._mysql.connect(**config), name=name, **self.pool_options)
+
+    @staticmethod
+    def _replica_config(address):
+        host, _, port = address.strip().partition(":")
+        return {"host": host, "port": int(port)} if port else {"host": host}
+
+    def connect(self, read_only=False, key=None):
+        return StorageConnection(self, self.router.get(read_only, key))
+
+    def mark_write(self, key):
+        self.router.mark_write(key)
+
+    def raw_cursor(self, pooled):
+        return pooled.cursor(dictionary=True)
+
+    def translate(self, sql):
+        return sql, False
+
+    def lock_for_update(self, raw_cursor, pooled):
+        pass
+
+    def explain(self, sql, params):
+        return explain_plan(self, "EXPLAIN ", sql, params)
+
+    def errors(self):
+        return translated_errors(self)
+
+    def convert_error(self, exc):
+        cls = IntegrityError if isinstance(exc, self._mysql.IntegrityError) else Error
+        return cls(exc.msg, exc.errno)
+
+    def stats(self):
+        return {"backend": self.name, **self.router.stats()}
+
+    def pools(self):
+        return self.router.pools()
+
+    def reset(self):
+        self.router.reset()
+
+    def warm_up(self, count):
+        with self.errors():
+            return self.router.warm_up(count)
+
+
+# ---------- SQLITE ----------
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+# Match MySQL's Python types for DECIMAL / DATE / TIMESTAMP columns
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+# (every DECIMAL column in the schema is DECIMAL(10, 2); SQLite drops the scale)
+sqlite3.register_converter("DECIMAL", lambda raw: Decimal(raw.decode()).quantize(Decimal("0.01")))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda raw: datetime.fromisoformat(raw.decode()))
+
+UPSERT_PATTERN = re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.IGNORECASE)
+VALUES_FUNCTION_PATTERN = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+FOR_UPDATE_PATTERN = re.compile(r"\s+(?:FOR UPDATE|LOCK IN SHARE MODE)\s*$", re.IGNORECASE)
+UNIQUE_FAILED_PATTERN = re.compile(r"UNIQUE constraint failed: ([\w.]+)")
+
+
+@lru_cache(maxsize=1024)
+def translate_mysql_to_sqlite(sql):
+    """Rewrite the MySQL dialect used by the routes into SQLite.
+
+    Returns (sql, write_lock): ``SELECT ... FOR UPDATE`` (or ``LOCK IN SHARE
+    MODE``) loses the clause and asks the cursor to take SQLite's write
+    lock (BEGIN IMMEDIATE) instead, which gives the same protection
+    against concurrent writers.
+    """
+    sql = sql.replace("%s", "?")
+    match = UPSERT_PATTERN.search(sql)
+    if match:
+        head, tail = sql[:match.start()], sql[match.end():]
+        sql = head + "ON CONFLICT DO UPDATE SET" + VALUES_FUNCTION_PATTERN.sub(r"excluded.\1", tail)
+    stripped = FOR_UPDATE_PATTERN.sub("", sql)
+    return stripped, stripped != sql
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    driver_error = sqlite3.Error
+
+    _memory_ids = itertools.count()
+
+    def __init__(self, path=":memory:", schema_path=SQLITE_SCHEMA_PATH, pool_size=5, timeout=5.0):
+        if path == ":memory:":
+            # A named shared-cache database lives as long as one connection
+            # to it is open; the keeper connection below is that one. A
+            # single pooled connection avoids shared-cache table locking.
+            self.uri = f"file:mobile_shop_{os.getpid()}_{next(self._memory_ids)}?mode=memory&cache=shared"
+            pool_size = 1
+        else:
+            self.uri = f"file:{os.path.abspath(path)}"
+        self.timeout = timeout
+        self._keeper = self._connect()
+        with open(schema_path) as f:
+            self._keeper.executescript(f.read())
+        self.pool = ConnectionPool(
+            self._connect, size=pool_size, timeout=timeout,
+            recycle=float("inf"), ping_after=float("inf"), name="sqlite"
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.uri, uri=True, timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA foreign_keys = ON")
+        if "mode=memory" not in self.uri:
+            conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def connect(self, read_only=False, key=None):
+        return StorageConnection(self, self.pool.get())
+
+    def mark_write(self, key):
+        pass
+
+    def raw_cursor(self, pooled):
+        return pooled.cursor()
+
+    def translate(self, sql):
+        return translate_mysql_to_sqlite(sql)
+
+    def lock_for_update(self, raw_cursor, pooled):
+        if not pooled.in_transaction:
+            raw_cursor.execute("BEGIN IMMEDIATE")
+
+    def explain(self, sql, params):
+        return explain_plan(self, "EXPLAIN QUERY PLAN ", sql, params)
+
+    def errors(self):
+        return translated_errors(self)
+
+    def convert_error(self, exc):
+        if isinstance(exc, sqlite3.IntegrityError):
+            match = UNIQUE_FAILED_PATTERN.search(str(exc))
+            if match:
+                # same shape as MySQL's message so callers can read the key name
+                return IntegrityError(f"Duplicate entry for key '{match.group(1)}'", ER_DUP_ENTRY)
+            return IntegrityError(str(exc))
+        return Error(str(exc))
+
+    def stats(self):
+        return {"backend": self.name, **self.pool.stats()}
+
+    def pools(self):
+        return {self.pool.name: self.pool}
+
+    def reset(self):
+        self.pool.reset()
+
+    def warm_up(self, count):
+        with self.errors():
+            return self.pool.warm_up(count)
+
+
+def create_backend():
+    """Build the backend selected by DB_BACKEND ("mysql" or "sqlite")"""
+    pool_options = {
+        "size": int(os.getenv('DB_POOL_SIZE', '10')),
+        "timeout": float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    }
+    if os.getenv('DB_BACKEND', 'mysql').lower() == 'sqlite':
+        return SQLiteBackend(
+            os.getenv('SQLITE_PATH', ':memory:'),
+            pool_size=pool_options["size"],
+            timeout=pool_options["timeout"]
+        )
+
+    config = {
+        "host": os.getenv('DB_HOST', 'localhost'),
+        "user": os.getenv('DB_USER', 'root'),
+        "password": os.getenv('DB_PASSWORD', 'A@ihb064'),
+        "database": os.getenv('DB_NAME', 'mobile_shop')
+    }
+    return MySQLBackend(
+        config,
+        # Read replicas, e.g. DB_REPLICA_HOSTS="replica1:3306,replica2:3306"
+        [a for a in os.getenv('DB_REPLICA_HOSTS', '').split(',') if a.strip()],
+        sticky_seconds=float(os.getenv('DB_STICKY_SECONDS', '5')),
+        recycle=float(os.getenv('DB_POOL_RECYCLE', '1800')),
+        ping_after=float(os.getenv('DB_POOL_PING_AFTER', '30')),
+        **pool_options
+    )
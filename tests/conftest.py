@@ -0,0 +1,87 @@
+"""
+Shared fixtures: every test gets the Flask app on a fresh SQLite database.
+
+The settings below have to be in place before Backend is imported:
+hashing runs inline with cheap parameters, and the inventory thread
+never reconciles on its own (tests call reconcile() when they need it).
+"""
+import os
+import sys
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ.setdefault("AUTH_SECRET", "test-secret")
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+os.environ["INVENTORY_RECONCILE_INTERVAL"] = "3600"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import Backend
+from auth_tokens import issue_token
+from catalog_cache import catalog_cache
+from inventory import Inventory
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """A file database, so concurrent requests get their own connections"""
+    database = SQLiteBackend(str(tmp_path / "shop.db"), pool_size=4)
+    monkeypatch.setattr(Backend, "database", database)
+    monkeypatch.setattr(Backend, "inventory", Inventory(
+        database, on_change=catalog_cache.stock_changed, reconcile_interval=3600
+    ))
+    catalog_cache.clear()
+    yield database
+    catalog_cache.clear()
+
+
+@pytest.fixture
+def client(backend):
+    return Backend.app.test_client()
+
+
+@pytest.fixture
+def admin():
+    return {"Authorization": "Bearer " + issue_token(1, "admin")}
+
+
+@pytest.fixture
+def signup(client):
+    """signup(name) -> (user_id, auth headers) for a new customer"""
+    def create(name):
+        r = client.post("/signup", json={"username": name, "email": f"{name}@example.com", "password": "secret1"})
+        assert r.status_code == 201, r.get_json()
+        body = r.get_json()
+        return body["user"]["user_id"], {"Authorization": "Bearer " + body["token"]}
+    return create
+
+
+def _query(sql, params=()):
+    db = Backend.database.connect()
+    cursor = db.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        db.close()
+
+
+@pytest.fixture
+def query(backend):
+    """query(sql, params) -> rows read straight from the test database"""
+    return _query
+
+
+@pytest.fixture
+def products(client, admin):
+    """products((sku, quantity), ...) -> [product_id, ...], all priced 100.00"""
+    def create(*items):
+        rows = [{"sku": sku, "name": sku, "price": "100.00", "quantity": quantity} for sku, quantity in items]
+        r = client.post("/products/bulk", json=rows, headers=admin)
+        assert r.get_json()["accepted"] == len(rows), r.get_json()
+        return [_query("SELECT product_id FROM products WHERE sku=%s", (sku,))[0]["product_id"] for sku, _ in items]
+    return create
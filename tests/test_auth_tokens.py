@@ -0,0 +1,52 @@
+"""Signed session tokens: issue, verify and per-user access checks"""
+import auth_tokens
+from auth_tokens import issue_token, verify_token
+
+
+def get(client, url, headers=None):
+    r = client.get(url, headers=headers)
+    r.close()  # releases a streamed response's connection
+    return r.status_code
+
+
+def test_login_token_identifies_the_user(client, signup):
+    user_id, _ = signup("alice")
+    r = client.post("/login", json={"username": "alice@example.com", "password": "secret1"})
+    assert r.status_code == 200
+    token = r.get_json()["token"]
+    assert verify_token(token)["uid"] == user_id
+    assert get(client, f"/cart/{user_id}", {"Authorization": f"Bearer {token}"}) == 200
+
+
+def test_wrong_password_gets_no_token(client, signup):
+    signup("alice")
+    r = client.post("/login", json={"username": "alice", "password": "wrong"})
+    assert r.status_code == 401
+    assert "token" not in r.get_json()
+
+
+def test_users_only_reach_their_own_data(client, admin, signup):
+    alice, alice_headers = signup("alice")
+    bob, _ = signup("bob")
+    assert get(client, f"/cart/{bob}", alice_headers) == 403
+    assert get(client, f"/cart/{alice}", admin) == 200
+    assert get(client, "/admin/hot-skus", alice_headers) == 403
+
+
+def test_bad_tokens_are_rejected(client, signup):
+    user_id, headers = signup("alice")
+    token = headers["Authorization"][len("Bearer "):]
+    payload, signature = token.split(".")
+    forged = issue_token(user_id, "admin").split(".")[0] + "." + signature
+    for bad in (forged, payload, token + "x", "é." + signature, "", "a.b.c"):
+        assert verify_token(bad) is None
+        assert get(client, f"/cart/{user_id}", {"Authorization": f"Bearer {bad}"}) == 401
+    assert get(client, f"/cart/{user_id}", {"Authorization": token}) == 401  # no "Bearer "
+    assert get(client, f"/cart/{user_id}") == 401
+
+
+def test_expired_and_foreign_tokens_are_rejected(monkeypatch):
+    assert verify_token(issue_token(1, "customer", ttl=-1)) is None
+    token = issue_token(1, "customer")
+    monkeypatch.setattr(auth_tokens, "SECRET", b"another process")
+    assert verify_token(token) is None
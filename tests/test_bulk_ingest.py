@@ -0,0 +1,59 @@
+"""POST /products/bulk: upsert by sku and per-row error reports"""
+
+
+def test_bulk_upserts_by_sku(client, admin, query):
+    rows = [{"sku": "p1", "name": "Phone", "price": "199.99", "quantity": 5},
+            {"sku": "p2", "name": "Case", "price": 10, "quantity": "7", "description": "Blue"}]
+    r = client.post("/products/bulk", json=rows, headers=admin)
+    assert r.status_code == 200
+    assert r.get_json() == {"message": "Bulk ingest complete", "accepted": 2, "failed": 0, "chunks": 1, "errors": []}
+
+    rows = [{"sku": "p1", "name": "Phone 2", "price": "149.50", "quantity": 9}]
+    assert client.post("/products/bulk", json=rows, headers=admin).get_json()["accepted"] == 1
+
+    products = query("SELECT sku, name, price, quantity, description FROM products ORDER BY sku")
+    assert [(p["sku"], p["name"], str(p["price"]), p["quantity"], p["description"]) for p in products] == [
+        ("p1", "Phone 2", "149.50", 9, ""),
+        ("p2", "Case", "10.00", 7, "Blue"),
+    ]
+
+
+def test_bad_rows_are_reported_and_skipped(client, admin, query):
+    rows = [
+        {"sku": "ok1", "name": "Phone", "price": "1", "quantity": 1},
+        {"name": "No sku", "price": "1", "quantity": 1},
+        {"sku": "bad-price", "name": "Phone", "price": "NaN", "quantity": 1},
+        "not an object",
+        {"sku": "ok2", "name": "Phone", "price": "1", "quantity": 1},
+        {"sku": "bad-quantity", "name": "Phone", "price": "1", "quantity": -1},
+        {"sku": "ok3", "name": "Phone", "price": "1", "quantity": 1},
+    ]
+    r = client.post("/products/bulk?chunk_size=2", json=rows, headers=admin)
+    assert r.status_code == 200
+    report = r.get_json()
+    assert (report["accepted"], report["failed"], report["chunks"]) == (3, 4, 2)
+    assert report["errors"] == [
+        {"row": 2, "error": "sku is required (max 64 characters)"},
+        {"row": 3, "error": "price must be a number"},
+        {"row": 4, "error": "Row must be an object"},
+        {"row": 6, "error": "quantity must not be negative"},
+    ]
+    assert [p["sku"] for p in query("SELECT sku FROM products ORDER BY sku")] == ["ok1", "ok2", "ok3"]
+
+
+def test_json_lines_body_reports_invalid_lines(client, admin, query):
+    body = b'{"sku": "a", "name": "A", "price": "1", "quantity": 1}\n{broken\n\n{"sku": "b", "name": "B", "price": "2", "quantity": 2}\n'
+    r = client.post("/products/bulk", data=body, content_type="application/x-ndjson", headers=admin)
+    report = r.get_json()
+    assert (report["accepted"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["row"] == 2
+    assert report["errors"][0]["error"].startswith("Invalid JSON")
+    assert len(query("SELECT * FROM products")) == 2
+
+
+def test_bulk_ingest_is_admin_only(client, admin, signup):
+    _, headers = signup("alice")
+    rows = [{"sku": "p1", "name": "Phone", "price": "1", "quantity": 1}]
+    assert client.post("/products/bulk", json=rows).status_code == 401
+    assert client.post("/products/bulk", json=rows, headers=headers).status_code == 403
+    assert client.post("/products/bulk", json=rows[0], headers=admin).status_code == 400
@@ -0,0 +1,145 @@
+"""Hot SKUs: reservations at add-to-cart, release, consumption and reconcile"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+import Backend
+
+
+@pytest.fixture
+def hot(client, admin, products):
+    """hot(quantity, shards) -> product_id of a new product marked hot"""
+    def create(quantity, shards=2):
+        (product_id,) = products((f"hot{quantity}-{shards}", quantity))
+        r = client.post("/admin/hot-skus", json={"product_id": product_id, "shards": shards}, headers=admin)
+        assert r.status_code == 200, r.get_json()
+        return product_id
+    return create
+
+
+@pytest.fixture
+def stock(client, admin):
+    """stock(product_id) -> (available, reserved) as /admin/hot-skus reports it"""
+    def read(product_id):
+        r = client.get("/admin/hot-skus", headers=admin)
+        row = next(row for row in r.get_json() if row["product_id"] == product_id)
+        return row["available"], row["reserved"]
+    return read
+
+
+def add(client, headers, product_id, quantity):
+    return client.post("/cart/add", json={"product_id": product_id, "quantity": quantity}, headers=headers)
+
+
+def test_add_to_cart_reserves_until_sold_out(client, signup, hot, stock):
+    phone = hot(5)
+    _, alice = signup("alice")
+    _, bob = signup("bob")
+    assert add(client, alice, phone, 3).status_code == 201
+    assert add(client, alice, phone, 2).status_code == 201
+    assert stock(phone) == (0, 5)
+    assert add(client, bob, phone, 1).status_code == 400
+
+
+def test_concurrent_reservations_never_oversell(client, signup, hot, stock, query):
+    phone = hot(5, shards=4)
+    buyers = [signup(f"buyer{i}")[1] for i in range(8)]
+    start = threading.Barrier(len(buyers))
+
+    def reserve(headers):
+        start.wait()
+        return add(client, headers, phone, 1).status_code
+
+    with ThreadPoolExecutor(len(buyers)) as pool:
+        statuses = list(pool.map(reserve, buyers))
+
+    assert sorted(statuses) == [201] * 5 + [400] * 3
+    assert stock(phone) == (0, 5)
+    assert query("SELECT MIN(available) AS lowest FROM inventory_shards")[0]["lowest"] == 0
+
+
+def test_removing_a_cart_line_releases_its_reservation(client, signup, hot, stock, query):
+    phone = hot(5)
+    alice_id, alice = signup("alice")
+    _, bob = signup("bob")
+    add(client, alice, phone, 5)
+    (line,) = query("SELECT cart_id FROM cart WHERE user_id=%s", (alice_id,))
+
+    # someone else's line is not found, and releases nothing
+    assert client.delete(f"/cart/{line['cart_id']}", headers=bob).status_code == 404
+    assert stock(phone) == (0, 5)
+
+    assert client.delete(f"/cart/{line['cart_id']}", headers=alice).status_code == 200
+    assert stock(phone) == (5, 0)
+    assert add(client, bob, phone, 5).status_code == 201
+
+
+def test_batch_set_and_remove_release_reservations(client, signup, hot, stock):
+    phone = hot(6, shards=3)
+    _, alice = signup("alice")
+    add(client, alice, phone, 4)
+    add(client, alice, phone, 2)
+
+    r = client.post("/cart/batch", json={"set": [{"product_id": phone, "quantity": 1}]}, headers=alice)
+    assert r.status_code == 200
+    assert stock(phone) == (5, 1)
+
+    # raising a line reserves nothing more; the order takes the rest
+    r = client.post("/cart/batch", json={"set": [{"product_id": phone, "quantity": 3}]}, headers=alice)
+    assert r.status_code == 200
+    assert stock(phone) == (5, 1)
+
+    r = client.post("/cart/batch", json={"remove": [phone]}, headers=alice)
+    assert r.status_code == 200
+    assert stock(phone) == (6, 0)
+
+
+def test_batch_remove_and_add_keeps_the_new_reservation(client, signup, hot, stock):
+    phone = hot(6, shards=3)
+    _, alice = signup("alice")
+    add(client, alice, phone, 4)
+
+    r = client.post("/cart/batch", json={"remove": [phone], "add": [{"product_id": phone, "quantity": 1}]},
+                    headers=alice)
+    assert r.status_code == 200
+    assert stock(phone) == (5, 1)
+
+
+def test_order_consumes_reservations_and_reconcile_syncs_products(client, signup, hot, stock, query):
+    phone = hot(5)
+    _, alice = signup("alice")
+    add(client, alice, phone, 2)
+
+    assert client.post("/order", json={}, headers=alice).status_code == 201
+    assert stock(phone) == (3, 0)
+    assert query("SELECT * FROM reservations") == []
+
+    assert Backend.inventory.reconcile() in ({phone: -2}, {})
+    assert query("SELECT quantity FROM products WHERE product_id=%s", (phone,))[0]["quantity"] == 3
+    assert sorted(row["available"] for row in query("SELECT available FROM inventory_shards")) == [1, 2]
+
+
+def test_order_tops_up_expired_reservations(client, signup, hot, stock):
+    phone = hot(5)
+    _, alice = signup("alice")
+    add(client, alice, phone, 2)
+    Backend.inventory.reservation_ttl = 0
+    add(client, alice, phone, 1)  # re-stamps both reservations with the zero TTL
+
+    Backend.inventory.reconcile()
+    assert stock(phone) == (5, 0)
+
+    # the cart still holds 3; the order takes them from the shards
+    assert client.post("/order", json={}, headers=alice).status_code == 201
+    assert stock(phone) == (2, 0)
+
+
+def test_unmark_hot_folds_shards_back_into_products(client, admin, signup, hot, query):
+    phone = hot(5)
+    _, alice = signup("alice")
+    add(client, alice, phone, 2)
+
+    assert client.delete(f"/admin/hot-skus/{phone}", headers=admin).status_code == 200
+    assert query("SELECT quantity FROM products WHERE product_id=%s", (phone,))[0]["quantity"] == 5
+    assert query("SELECT * FROM reservations") == [] and query("SELECT * FROM inventory_shards") == []
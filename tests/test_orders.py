@@ -0,0 +1,79 @@
+"""Order placement: stock checks under FOR UPDATE and the set-based writes"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+def test_concurrent_orders_never_oversell(client, signup, products, query):
+    (phone,) = products(("phone", 5))
+    buyers = [signup(f"buyer{i}")[1] for i in range(4)]
+    for headers in buyers:
+        assert client.post("/cart/add", json={"product_id": phone, "quantity": 2}, headers=headers).status_code == 201
+
+    start = threading.Barrier(len(buyers))
+
+    def order(headers):
+        start.wait()
+        return client.post("/order", json={}, headers=headers)
+
+    with ThreadPoolExecutor(len(buyers)) as pool:
+        responses = list(pool.map(order, buyers))
+
+    placed = [r for r in responses if r.status_code == 201]
+    refused = [r for r in responses if r.status_code == 400]
+    assert len(placed) == 2 and len(refused) == 2
+    for r in refused:
+        assert r.get_json()["failed_items"] == [{"product_id": phone, "requested": 2, "available": 1}]
+    assert query("SELECT quantity FROM products WHERE product_id=%s", (phone,))[0]["quantity"] == 1
+    assert query("SELECT SUM(quantity) AS sold FROM order_items")[0]["sold"] == 4
+
+
+def test_order_covers_every_cart_line(client, signup, products, query):
+    phone, case = products(("phone", 5), ("case", 10))
+    user_id, headers = signup("alice")
+    client.post("/cart/add", json={"product_id": phone, "quantity": 1}, headers=headers)
+    client.post("/cart/add", json={"product_id": case, "quantity": 2}, headers=headers)
+    client.post("/cart/add", json={"product_id": case, "quantity": 1}, headers=headers)
+
+    r = client.post("/order", json={}, headers=headers)
+    assert r.status_code == 201
+    order_id = r.get_json()["order_id"]
+
+    stock = {row["product_id"]: row["quantity"] for row in query("SELECT product_id, quantity FROM products")}
+    assert stock == {phone: 4, case: 7}
+    items = query("SELECT product_id, quantity FROM order_items WHERE order_id=%s ORDER BY product_id", (order_id,))
+    assert items == [{"product_id": phone, "quantity": 1}, {"product_id": case, "quantity": 3}]
+    assert str(query("SELECT total_amount FROM orders WHERE order_id=%s", (order_id,))[0]["total_amount"]) == "400.00"
+    assert query("SELECT * FROM cart WHERE user_id=%s", (user_id,)) == []
+
+
+def test_refused_order_changes_nothing(client, admin, signup, products, query):
+    phone, case = products(("phone", 5), ("case", 10))
+    user_id, headers = signup("alice")
+    client.post("/cart/add", json={"product_id": phone, "quantity": 3}, headers=headers)
+    client.post("/cart/add", json={"product_id": case, "quantity": 1}, headers=headers)
+    # stock drops after the items were added
+    client.post("/products/bulk", json=[{"sku": "phone", "name": "phone", "price": "100.00", "quantity": 2}],
+                headers=admin)
+
+    r = client.post("/order", json={}, headers=headers)
+    assert r.status_code == 400
+    assert r.get_json()["failed_items"] == [{"product_id": phone, "requested": 3, "available": 2}]
+    stock = {row["product_id"]: row["quantity"] for row in query("SELECT product_id, quantity FROM products")}
+    assert stock == {phone: 2, case: 10}
+    assert query("SELECT * FROM orders") == []
+    assert len(query("SELECT * FROM cart WHERE user_id=%s", (user_id,))) == 2
+
+
+def test_empty_cart_is_refused(client, signup):
+    _, headers = signup("alice")
+    r = client.post("/order", json={}, headers=headers)
+    assert r.status_code == 400
+    assert r.get_json()["message"] == "Cart is empty"
+
+
+def test_orders_for_other_users_are_forbidden(client, signup, products):
+    (phone,) = products(("phone", 5))
+    alice, alice_headers = signup("alice")
+    _, bob_headers = signup("bob")
+    client.post("/cart/add", json={"product_id": phone, "quantity": 1}, headers=alice_headers)
+    assert client.post("/order", json={"user_id": alice}, headers=bob_headers).status_code == 403